@@ -1,9 +1,16 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from .router import config
+def create_app(proxy=None):
+    """
+    创建 FastAPI 应用
 
-
-def create_app():
+    参数:
+        proxy (WebSocketProxy | None): 要挂载的代理实例；为空且配置 PROXY_MODE 为
+            embedded 时按配置创建，使代理与 FastAPI 运行在同一进程、同一事件循环中
+    """
+    # FastAPI 只在主进程中需要，延迟导入，避免代理进程导入 app 包时加载
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from .config import ConfigManager
+    from .router import config, profile
 
     app = FastAPI()
 
@@ -17,5 +24,23 @@ def create_app():
 
     # 注册路由
     app.include_router(config.router)
+    app.include_router(profile.router)
+
+    # 单进程模式：代理以 WebSocket 路由的形式挂载
+    if proxy is None and ConfigManager().get_str("PROXY_MODE") == "embedded":
+        from .utils.logger import setup_logging
+        from .utils.system_info import setup_opus
+        from .proxy.process_handler import create_proxy
+
+        setup_logging()  # uvicorn 多 worker 模式下每个 worker 都会调用 create_app
+        setup_opus()
+        proxy = create_proxy()
+
+    if proxy is not None:
+        from .router import proxy as proxy_router
+
+        app.state.proxy = proxy
+        app.add_event_handler("startup", proxy.register_identities)
+        app.include_router(proxy_router.router)
 
     return app
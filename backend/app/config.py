@@ -1,14 +1,140 @@
 import os
-from .utils.logger import get_logger
 import json
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from types import MappingProxyType
+from typing import Any, Mapping
+from .utils.logger import get_logger
 from .utils.device import get_client_id, get_mac_address
-from .constant.file import BASE_DIR
+from .constant.file import CONFIG_DIR, CONFIG_FILE, CONFIG_LOCK_FILE
 
 logger = get_logger(__name__)
 
+# 环境变量覆盖的前缀，如 XIAOZHI_WS_URL 覆盖 WS_URL（仅在本进程生效，不会写回配置文件）
+ENV_PREFIX = "XIAOZHI_"
+# 配置文件的版本号字段，每次保存加一
+VERSION_KEY = "CONFIG_VERSION"
+
+
+@contextmanager
+def _config_file_lock():
+    """跨进程的配置文件写锁（FastAPI 进程、代理进程与多个 worker 可能同时写入）"""
+    os.makedirs(CONFIG_DIR, exist_ok=True)
+    with open(CONFIG_LOCK_FILE, "a+") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ConfigField:
+    """配置项的类型、默认值与可选值"""
+
+    def __init__(self, type_: type, default: Any, choices: tuple | None = None):
+        self.type = type_
+        self.default = default
+        self.choices = choices
+
+    def validate(self, key: str, value: Any) -> Any:
+        """校验并转换为声明的类型，失败时抛出 ValueError"""
+        if self.type is bool:
+            if isinstance(value, str):
+                lowered = value.strip().lower()
+                if lowered in ("true", "1", "yes", "on"):
+                    value = True
+                elif lowered in ("false", "0", "no", "off", ""):
+                    value = False
+            if not isinstance(value, bool):
+                raise ValueError(f"配置项 {key} 应为布尔值: {value!r}")
+        elif self.type is int:
+            if isinstance(value, bool):
+                raise ValueError(f"配置项 {key} 应为整数: {value!r}")
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"配置项 {key} 应为整数: {value!r}")
+        elif self.type is list:
+            if isinstance(value, str):
+                # 环境变量中以 JSON 字符串给出
+                try:
+                    value = json.loads(value)
+                except json.JSONDecodeError:
+                    raise ValueError(f"配置项 {key} 应为 JSON 数组: {value!r}")
+            if not isinstance(value, list):
+                raise ValueError(f"配置项 {key} 应为数组: {value!r}")
+        elif self.type is str:
+            if value is None or isinstance(value, (dict, list)):
+                raise ValueError(f"配置项 {key} 应为字符串: {value!r}")
+            value = str(value)
+
+        if self.choices is not None and value not in self.choices:
+            raise ValueError(f"配置项 {key} 的取值应为 {self.choices} 之一: {value!r}")
+        return value
+
+
+CONFIG_SCHEMA: dict[str, ConfigField] = {
+    "WS_URL": ConfigField(str, "wss://api.tenclass.net/xiaozhi/v1/"),
+    "WS_PROXY_URL": ConfigField(str, "ws://0.0.0.0:5000"),
+    "OTA_VERSION_URL": ConfigField(str, "https://api.tenclass.net/xiaozhi/ota/"),
+    "TOKEN_ENABLE": ConfigField(bool, True),
+    "TOKEN": ConfigField(str, "test_token"),
+    "BACKEND_URL": ConfigField(str, "http://0.0.0.0:8081"),
+    "CLIENT_ID": ConfigField(str, ""),
+    "DEVICE_ID": ConfigField(str, ""),
+    # process: 代理运行在独立进程（WS_PROXY_URL）; embedded: 代理挂载在 FastAPI 的 /proxy 路由
+    "PROXY_MODE": ConfigField(str, "process", choices=("process", "embedded")),
+    "WORKERS": ConfigField(int, 1),  # embedded 模式下 uvicorn 的 worker 数，MQTT 模式或 DEVICE_MAX_SESSIONS > 0 时必须为 1
+    # 代理连接小智服务器的方式: websocket（WS_URL）; mqtt（OTA 下发的 MQTT 控制通道 + 加密 UDP 音频通道）
+    "UPSTREAM_TRANSPORT": ConfigField(str, "websocket", choices=("websocket", "mqtt")),
+    # 上行 Opus 编码自适应范围（码率限制在 500~512000，帧长可选 20/40/60 毫秒）
+    "OPUS_MIN_BITRATE": ConfigField(int, 12000),
+    "OPUS_MAX_BITRATE": ConfigField(int, 32000),
+    "OPUS_MIN_COMPLEXITY": ConfigField(int, 2),
+    "OPUS_MAX_COMPLEXITY": ConfigField(int, 10),
+    "OPUS_MIN_FRAME_DURATION": ConfigField(int, 60, choices=(20, 40, 60)),
+    "OPUS_MAX_FRAME_DURATION": ConfigField(int, 60, choices=(20, 40, 60)),
+    # 设备身份池：[{"device_id": ..., "client_id": ..., "token": ...}]，为空时使用 DEVICE_ID / CLIENT_ID
+    "DEVICES": ConfigField(list, []),
+    "DEVICE_POOL_SIZE": ConfigField(int, 0),  # 身份不足该数量时自动生成并写回 DEVICES
+    "DEVICE_MAX_SESSIONS": ConfigField(int, 0),  # 每个身份的最大并发连接数，0 表示不限制（MQTT 模式固定为 1）
+    "DEVICE_STICKY": ConfigField(bool, True),  # 同一浏览器优先分配上次使用的身份
+    "PROFILING_ENABLE": ConfigField(bool, False),  # 是否开放 /profile 分析接口
+    # 分析接口的访问令牌，请求头 X-Profiling-Token 需与之一致；为空时拒绝所有分析请求
+    "PROFILING_TOKEN": ConfigField(str, ""),
+    "PROFILING_TIMERS": ConfigField(bool, False),  # 启动时是否开启热路径阶段计时
+}
+
 
 class ConfigManager:
+    """
+    配置管理（单例）
+
+    配置在首次创建时加载一次，校验后保存为只读快照，读取只是一次字典查找；
+    更新时生成新的快照并通过 "写临时文件 + 重命名" 原子地写回磁盘，
+    同时保留上一版本为 config.json.bak。
+
+    多个进程共用同一个配置文件：更新在文件锁内重新读取磁盘上的配置，若其版本号
+    与本进程加载的不同（已被其他进程修改），则在最新配置的基础上合并本次修改。
+    """
+
     _instance = None
+    _initialized = False
 
     def __new__(cls):
         if cls._instance is None:
@@ -16,49 +142,129 @@ class ConfigManager:
         return cls._instance
 
     def __init__(self):
-        self._default_config = {
-            "WS_URL": "wss://api.tenclass.net/xiaozhi/v1/",
-            "WS_PROXY_URL": "ws://0.0.0.0:5000",
-            "OTA_VERSION_URL": "https://api.tenclass.net/xiaozhi/ota/",
-            "TOKEN_ENABLE": True,
-            "TOKEN": "test_token",
-            "BACKEND_URL": "http://0.0.0.0:8081",
-        }
-        self._config = {}
-        self._init_config()
+        # 单例只初始化一次，避免每次 ConfigManager() 都重新读取配置文件
+        if self._initialized:
+            return
+        self._initialized = True
+        self._lock = threading.Lock()
+        self._file_config: dict[str, Any] = {}  # 配置文件中的内容（不含环境变量覆盖）
+        self._snapshot: Mapping[str, Any] = MappingProxyType({})
+        with _config_file_lock():
+            self._init_config()
 
     def _init_config(self) -> None:
-        """确保配置文件存在，否则创建并使用默认配置"""
-        config_file_path = os.path.join(BASE_DIR, "config", "config.json")
+        """加载配置文件，不存在时创建默认配置"""
+        if os.path.exists(CONFIG_FILE):
+            logger.info(f"正在加载本地配置: {CONFIG_FILE}")
+            file_config = self._read_config_file()
+            need_write = False
+        else:
+            logger.info(f"本地配置文件不存在，正在创建默认配置: {CONFIG_FILE}")
+            file_config = {key: field.default for key, field in CONFIG_SCHEMA.items()}
+            need_write = True
+
+        # 补全设备标识，保证重启后保持不变
+        if not file_config.get("CLIENT_ID"):
+            file_config["CLIENT_ID"] = get_client_id()
+            need_write = True
+        if not file_config.get("DEVICE_ID"):
+            file_config["DEVICE_ID"] = get_mac_address()
+            need_write = True
+
+        self._file_config = self._validate(file_config, strict=False)
+        self._snapshot = self._build_snapshot(self._file_config)
+        if need_write:
+            self._write_config_file(self._file_config)
+
+    def _read_config_file(self) -> dict[str, Any]:
+        """读取配置文件；文件损坏时保留现场并尝试从上一版本恢复"""
+        try:
+            with open(CONFIG_FILE, "r") as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError("配置文件内容不是 JSON 对象")
+            return data
+        except (json.JSONDecodeError, ValueError) as e:
+            corrupt_path = CONFIG_FILE + ".corrupt"
+            logger.error(f"配置文件格式错误: {e}，已保存至 {corrupt_path}")
+            os.replace(CONFIG_FILE, corrupt_path)
+
+        try:
+            with open(CONFIG_FILE + ".bak", "r") as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError("配置备份内容不是 JSON 对象")
+            logger.warning("已从上一版本的配置文件恢复配置")
+            self._write_config_file(data)
+            return data
+        except (OSError, json.JSONDecodeError, ValueError):
+            logger.warning("没有可用的配置备份，使用默认配置")
+            return {}
+
+    def _validate(self, config: Mapping[str, Any], strict: bool) -> dict[str, Any]:
+        """
+        按 CONFIG_SCHEMA 校验配置
 
-        if not os.path.exists(config_file_path):
-            logger.info("本地配置文件不存在，正在创建默认配置: ", config_file_path)
-            os.makedirs(os.path.join(BASE_DIR, "config"), exist_ok=True)
-            self._default_config["CLIENT_ID"] = get_client_id()
-            self._default_config["DEVICE_ID"] = get_mac_address()
-            with open(config_file_path, "w") as f:
-                json.dump(self._default_config, f, indent=4)
+        参数:
+            strict (bool): 为 True 时遇到无效值抛出 ValueError，否则记录警告并使用默认值
+        """
+        validated = dict(config)
+        for key, field in CONFIG_SCHEMA.items():
+            if key not in config:
+                continue
+            try:
+                validated[key] = field.validate(key, config[key])
+            except ValueError as e:
+                if strict:
+                    raise
+                logger.warning(f"{e}，使用默认值: {field.default!r}")
+                validated[key] = field.default
+        return validated
 
-        logger.info(f"正在加载本地配置: {config_file_path}")
+    def _build_snapshot(self, file_config: Mapping[str, Any]) -> Mapping[str, Any]:
+        """默认值 <- 配置文件 <- 环境变量，生成只读快照"""
+        config = {key: field.default for key, field in CONFIG_SCHEMA.items()}
+        config.update(file_config)
+        for key, field in CONFIG_SCHEMA.items():
+            env_value = os.environ.get(ENV_PREFIX + key)
+            if env_value is None:
+                continue
+            try:
+                config[key] = field.validate(key, env_value)
+                logger.info(f"配置项 {key} 已被环境变量 {ENV_PREFIX + key} 覆盖")
+            except ValueError as e:
+                logger.warning(f"忽略环境变量 {ENV_PREFIX + key}: {e}")
+        return MappingProxyType(config)
 
+    def _write_config_file(self, config: dict[str, Any]) -> None:
+        """原子写入：写入同目录下的临时文件后重命名，进程崩溃不会留下半个文件"""
+        os.makedirs(CONFIG_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CONFIG_DIR, prefix=".config.", suffix=".tmp")
         try:
-            with open(config_file_path, "r") as f:
-                self._config = json.load(f)
-        except json.JSONDecodeError:
-            logger.warning("配置文件格式错误，正在重置配置")
-            with open(config_file_path, "w") as f:
-                json.dump(self._default_config, f, indent=4)
-            self._config = self._default_config
+            with os.fdopen(fd, "w") as f:
+                json.dump(config, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            # 备份同样通过复制 + 重命名完成，保证任意时刻 config.json 都存在且完整
+            if os.path.exists(CONFIG_FILE):
+                shutil.copyfile(CONFIG_FILE, tmp_path + ".bak")
+                os.replace(tmp_path + ".bak", CONFIG_FILE + ".bak")
+            os.replace(tmp_path, CONFIG_FILE)
+        except BaseException:
+            for path in (tmp_path, tmp_path + ".bak"):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
 
-    def get(self, key: str) -> str | bool | None:
-        return self._config.get(key)
+    def get(self, key: str) -> Any:
+        return self._snapshot.get(key)
 
     def get_str(self, key: str, default: str = "") -> str:
-        value = self._config.get(key, default)
+        value = self._snapshot.get(key)
         return str(value) if value is not None else default
 
     def get_bool(self, key: str, default: bool = False) -> bool:
-        value = self._config.get(key, default)
+        value = self._snapshot.get(key, default)
         if isinstance(value, bool):
             return value
         if isinstance(value, str):
@@ -66,20 +272,59 @@ class ConfigManager:
         return bool(value)
 
     def get_int(self, key: str, default: int = 0) -> int:
-        value = self._config.get(key, default)
+        value = self._snapshot.get(key, default)
+        if isinstance(value, int):
+            return value
         try:
             return int(value) if value is not None else default
         except (ValueError, TypeError):
             return default
 
-    def set(self, key: str, value: str | bool) -> None:
-        self._config[key] = value
+    @property
+    def config(self) -> Mapping[str, Any]:
+        """当前配置的只读快照"""
+        return self._snapshot
 
     @property
-    def config(self) -> dict:
-        return self._config
+    def version(self) -> int:
+        return int(self._file_config.get(VERSION_KEY, 0))
+
+    def update(self, values: Mapping[str, Any]) -> None:
+        """
+        校验并更新配置，原子地写回配置文件
+
+        参数:
+            values (Mapping): 要更新的配置项，键为 CONFIG_SCHEMA 中的配置名
+
+        异常:
+            ValueError: 配置名未知或取值无效
+        """
+        unknown = [key for key in values if key not in CONFIG_SCHEMA]
+        if unknown:
+            raise ValueError(f"未知的配置项: {', '.join(unknown)}")
+
+        validated = self._validate(values, strict=True)
+        with self._lock, _config_file_lock():
+            file_config = self._read_latest()
+            file_config.update(validated)
+            file_config[VERSION_KEY] = int(file_config.get(VERSION_KEY, 0)) + 1
+            self._write_config_file(file_config)
+            self._file_config = file_config
+            self._snapshot = self._build_snapshot(file_config)
+        logger.info(f"配置已更新至版本 {file_config[VERSION_KEY]}: {list(values)}")
+
+    def _read_latest(self) -> dict[str, Any]:
+        """读取磁盘上的最新配置（需持有文件锁），被其他进程修改过时以其为准"""
+        try:
+            with open(CONFIG_FILE, "r") as f:
+                disk_config = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return dict(self._file_config)
+        if not isinstance(disk_config, dict):
+            return dict(self._file_config)
 
-    def save_config(self) -> None:
-        config_file_path = os.path.join(BASE_DIR, "config", "config.json")
-        with open(config_file_path, "w") as f:
-            json.dump(self._config, f, indent=4)
+        disk_version = int(disk_config.get(VERSION_KEY, 0))
+        if disk_version == self.version:
+            return dict(self._file_config)
+        logger.info(f"配置文件已被其他进程更新（版本 {self.version} -> {disk_version}），合并本次修改")
+        return self._validate(disk_config, strict=False)
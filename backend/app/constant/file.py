@@ -3,3 +3,5 @@ import os
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 CONFIG_DIR = os.path.join(BASE_DIR, "config")
 CONFIG_FILE = os.path.join(CONFIG_DIR, "config.json")
+OPUS_CACHE_FILE = os.path.join(CONFIG_DIR, ".opus_path")
+CONFIG_LOCK_FILE = os.path.join(CONFIG_DIR, ".config.lock")
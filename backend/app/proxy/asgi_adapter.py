@@ -0,0 +1,44 @@
+from starlette.websockets import WebSocket
+
+
+class ASGIWebSocketAdapter:
+    """
+    将 Starlette/FastAPI 的 WebSocket 包装成 websockets 库连接的接口，
+    使 WebSocketProxy.proxy_handler 可以直接运行在 uvicorn 的事件循环中
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+
+    @property
+    def remote_address(self) -> tuple[str, int] | None:
+        client = self.websocket.client
+        return (client.host, client.port) if client else None
+
+    @property
+    def path(self) -> str:
+        url = self.websocket.url
+        return f"{url.path}?{url.query}" if url.query else url.path
+
+    def __aiter__(self):
+        return self._iter_messages()
+
+    async def _iter_messages(self):
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("text") is not None:
+                yield message["text"]
+            elif message.get("bytes") is not None:
+                yield message["bytes"]
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        await self.websocket.close(code, reason)
+
+    async def send(self, data: str | bytes | memoryview) -> None:
+        if isinstance(data, str):
+            await self.websocket.send_text(data)
+        else:
+            # ASGI 消息要求 bytes，且发送后缓冲区会被复用，这里必须复制
+            await self.websocket.send_bytes(bytes(data))
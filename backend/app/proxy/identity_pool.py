@@ -0,0 +1,111 @@
+import random
+import uuid
+from collections import OrderedDict
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class DeviceIdentity:
+    """代理对上游服务器冒充的一台小智设备"""
+
+    def __init__(self, device_id: str, client_id: str, token: str = ""):
+        self.device_id = device_id
+        self.client_id = client_id
+        self.token = token
+        self.active: int = 0  # 当前租用该身份的连接数
+        self.registered: bool = False  # 是否已完成 OTA 注册
+        self.mqtt_info: dict | None = None  # OTA 注册返回的 MQTT 连接信息
+
+    def to_dict(self) -> dict:
+        return {"device_id": self.device_id, "client_id": self.client_id, "token": self.token}
+
+
+def generate_identity(token: str = "") -> DeviceIdentity:
+    """生成一个新的设备身份（本地管理的随机 MAC 地址 + 随机 Client-Id）"""
+    # 首字节置位 locally administered 且清除 multicast 位，避免与真实网卡冲突
+    octets = [random.randint(0, 255) for _ in range(6)]
+    octets[0] = (octets[0] | 0x02) & 0xFE
+    device_id = ":".join(f"{octet:02x}" for octet in octets)
+    return DeviceIdentity(device_id, str(uuid.uuid4()), token)
+
+
+class IdentityPool:
+    """
+    设备身份池：每个浏览器连接租用一个设备身份，断开时归还
+
+    参数:
+        identities (list[DeviceIdentity]): 可用的设备身份
+        max_sessions (int): 每个身份允许的最大并发连接数，0 表示不限制
+        sticky (bool): 是否让同一浏览器优先使用上次分配的身份（仅当该身份空闲时）
+        sticky_capacity (int): 记录的浏览器 -> 身份映射的最大数量
+    """
+
+    def __init__(
+        self,
+        identities: list[DeviceIdentity],
+        max_sessions: int = 0,
+        sticky: bool = True,
+        sticky_capacity: int = 4096,
+    ):
+        if not identities:
+            raise ValueError("设备身份池不能为空")
+        self.identities = identities
+        self.max_sessions = max_sessions
+        self.sticky = sticky
+        self.sticky_capacity = sticky_capacity
+        self._by_device_id = {identity.device_id: identity for identity in identities}
+        self._sticky_map: OrderedDict[str, str] = OrderedDict()
+
+    def _available(self, identity: DeviceIdentity) -> bool:
+        return self.max_sessions <= 0 or identity.active < self.max_sessions
+
+    def acquire(self, browser_key: str | None = None) -> DeviceIdentity | None:
+        """
+        租用一个设备身份
+
+        参数:
+            browser_key (str | None): 浏览器标识，用于粘性分配
+
+        返回:
+            DeviceIdentity | None: 租到的身份；所有身份都已达到并发上限时返回 None
+        """
+        identity = None
+        if self.sticky and browser_key is not None:
+            device_id = self._sticky_map.get(browser_key)
+            if device_id is not None:
+                candidate = self._by_device_id.get(device_id)
+                # 只复用空闲的身份：浏览器标识退化为客户端 IP 时（NAT / 反向代理之后），
+                # 多个浏览器共用同一个键，不能因此挤在同一台设备上
+                if candidate is not None and candidate.active == 0:
+                    identity = candidate
+
+        if identity is None:
+            available = [i for i in self.identities if self._available(i)]
+            if not available:
+                return None
+            identity = min(available, key=lambda i: i.active)
+
+        identity.active += 1
+        if self.sticky and browser_key is not None:
+            self._sticky_map[browser_key] = identity.device_id
+            self._sticky_map.move_to_end(browser_key)
+            if len(self._sticky_map) > self.sticky_capacity:
+                self._sticky_map.popitem(last=False)
+        return identity
+
+    def release(self, identity: DeviceIdentity) -> None:
+        """归还设备身份"""
+        identity.active = max(0, identity.active - 1)
+
+    def discard(self, identity: DeviceIdentity) -> None:
+        """从池中移除设备身份（如 OTA 注册失败），已租用的连接不受影响"""
+        if self._by_device_id.pop(identity.device_id, None) is not None:
+            self.identities.remove(identity)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "identities": len(self.identities),
+            "leased": sum(identity.active for identity in self.identities),
+            "busy_identities": sum(1 for i in self.identities if not self._available(i)),
+        }
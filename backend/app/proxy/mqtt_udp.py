@@ -0,0 +1,243 @@
+import asyncio
+import json
+import ssl
+import struct
+import time
+import paho.mqtt.client as mqtt
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# UDP 音频包: 16 字节 nonce（明文）+ AES-128-CTR 加密的 Opus 数据，nonce 同时作为 CTR 的初始计数器
+# nonce 字段（大端）: type(1) | flags(1) | payload_len(2) | ssrc(4) | timestamp(4) | sequence(4)
+# type / flags / ssrc 取自服务器 hello 中下发的 nonce，其余字段每个包重新填写
+UDP_NONCE = struct.Struct(">BBHIII")
+UDP_PACKET_TYPE = 0x01
+MQTT_TLS_PORT = 8883
+
+
+class UdpAudioChannel(asyncio.DatagramProtocol):
+    """
+    加密的 UDP 音频通道
+
+    收到的包按序号处理：迟到或重复的包直接丢弃，丢失的包不重传，
+    因此一个丢包不会像 TCP 那样阻塞其后所有的音频。
+
+    参数:
+        key (bytes): AES-128 密钥
+        nonce (bytes): 服务器下发的 16 字节 nonce 模板
+        on_audio (Callable[[bytes], None]): 收到解密后的 Opus 数据时调用
+    """
+
+    def __init__(self, key: bytes, nonce: bytes, on_audio):
+        self.cipher = algorithms.AES(key)
+        self.packet_type, self.flags, _, self.ssrc, _, _ = UDP_NONCE.unpack(nonce)
+        self.on_audio = on_audio
+        self.transport: asyncio.DatagramTransport | None = None
+        self.peer: tuple | None = None  # 未 connect 的 socket 发送时使用的对端地址
+        self.local_sequence: int = 0
+        self.remote_sequence: int = 0
+        self.lost: int = 0  # 序号不连续推算出的丢包数
+        self.late: int = 0  # 迟到或重复而被丢弃的包数
+        self._start = time.monotonic()
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if len(data) < UDP_NONCE.size or data[0] != self.packet_type:
+            return
+        _, _, size, _, _, sequence = UDP_NONCE.unpack_from(data)
+        if sequence <= self.remote_sequence:
+            self.late += 1
+            return
+        if sequence > self.remote_sequence + 1:
+            self.lost += sequence - self.remote_sequence - 1
+        self.remote_sequence = sequence
+        nonce = data[: UDP_NONCE.size]
+        self.on_audio(self._crypt(nonce, data[UDP_NONCE.size : UDP_NONCE.size + size]))
+
+    def error_received(self, exc: Exception) -> None:
+        logger.warning(f"UDP 音频通道错误: {exc}")
+
+    def send(self, opus_data: bytes) -> None:
+        if self.transport is None or self.transport.is_closing():
+            return
+        self.local_sequence = (self.local_sequence + 1) & 0xFFFFFFFF
+        timestamp = int((time.monotonic() - self._start) * 1000) & 0xFFFFFFFF
+        nonce = UDP_NONCE.pack(
+            self.packet_type, self.flags, len(opus_data), self.ssrc, timestamp, self.local_sequence
+        )
+        self.transport.sendto(nonce + self._crypt(nonce, opus_data), self.peer)
+
+    def _crypt(self, nonce: bytes, data: bytes) -> bytes:
+        # CTR 模式加解密相同
+        cryptor = Cipher(self.cipher, modes.CTR(nonce)).encryptor()
+        return cryptor.update(data) + cryptor.finalize()
+
+    def close(self) -> None:
+        if self.transport is not None:
+            self.transport.close()
+
+
+class MqttUdpConnection:
+    """
+    通过 MQTT + UDP 连接上游服务器：JSON 控制消息走 MQTT，Opus 音频走加密的 UDP 通道
+
+    提供与 websockets 客户端连接相同的接口（async with / send / async for），
+    proxy_handler 不需要区分上游的传输方式：
+        - 浏览器发来的 hello 改写为 transport=udp 后经 MQTT 发出
+        - 服务器回复的 hello 中带有 UDP 地址与密钥，据此建立音频通道后再转给浏览器
+        - 服务器发来 goodbye 或 MQTT 断开时迭代结束，相当于上游关闭了连接
+
+    参数:
+        mqtt_info (dict): OTA 服务器返回的 MQTT 连接信息
+            （endpoint、client_id、username、password、publish_topic、subscribe_topic）
+        connect_timeout (float): 连接 MQTT 服务器的超时时间（秒）
+    """
+
+    def __init__(self, mqtt_info: dict, connect_timeout: float = 10):
+        self.mqtt_info = mqtt_info
+        self.connect_timeout = connect_timeout
+        self.session_id: str = ""
+        self.udp: UdpAudioChannel | None = None
+        self._client: mqtt.Client | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._messages: asyncio.Queue[str | bytes | None] = asyncio.Queue()
+        self._closed = False
+
+    async def __aenter__(self):
+        try:
+            await self.connect()
+        except BaseException:
+            await self.close()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def connect(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        host, _, port = self.mqtt_info["endpoint"].partition(":")
+        port = int(port) if port else MQTT_TLS_PORT
+
+        client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2, client_id=self.mqtt_info["client_id"]
+        )
+        client.username_pw_set(self.mqtt_info.get("username"), self.mqtt_info.get("password"))
+        if port == MQTT_TLS_PORT:
+            client.tls_set_context(ssl.create_default_context())
+
+        connected = self._loop.create_future()
+        subscribe_topic = self.mqtt_info.get("subscribe_topic")
+
+        # 以下回调运行在 paho 的网络线程中，需要切回事件循环
+        def on_connect(client, userdata, flags, reason_code, properties):
+            if reason_code.is_failure:
+                error = ConnectionError(f"MQTT 连接被拒绝: {reason_code}")
+                self._loop.call_soon_threadsafe(_set_exception, connected, error)
+                return
+            if subscribe_topic and subscribe_topic != "null":
+                client.subscribe(subscribe_topic)
+            self._loop.call_soon_threadsafe(_set_result, connected)
+
+        def on_message(client, userdata, message):
+            self._loop.call_soon_threadsafe(
+                self._messages.put_nowait, message.payload.decode("utf-8", errors="replace")
+            )
+
+        def on_disconnect(client, userdata, flags, reason_code, properties):
+            if not self._closed:
+                logger.warning(f"MQTT 连接断开: {reason_code}")
+                self._loop.call_soon_threadsafe(self._messages.put_nowait, None)
+
+        client.on_connect = on_connect
+        client.on_message = on_message
+        client.on_disconnect = on_disconnect
+        self._client = client
+
+        client.connect_async(host, port, keepalive=60)
+        client.loop_start()
+        await asyncio.wait_for(connected, self.connect_timeout)
+        logger.info(f"已连接至 MQTT 服务器: {host}:{port}")
+
+    async def _open_udp(self, udp_info: dict) -> None:
+        if self.udp is not None:
+            self.udp.close()
+        _, self.udp = await self._loop.create_datagram_endpoint(
+            lambda: UdpAudioChannel(
+                bytes.fromhex(udp_info["key"]),
+                bytes.fromhex(udp_info["nonce"]),
+                self._messages.put_nowait,
+            ),
+            remote_addr=(udp_info["server"], int(udp_info["port"])),
+        )
+        logger.info(f"UDP 音频通道已建立: {udp_info['server']}:{udp_info['port']}")
+
+    async def send(self, message: str | bytes) -> None:
+        if isinstance(message, str):
+            try:
+                data = json.loads(message)
+            except json.JSONDecodeError:
+                data = None
+            if isinstance(data, dict) and data.get("type") == "hello":
+                data["transport"] = "udp"
+                message = json.dumps(data)
+            self._client.publish(self.mqtt_info["publish_topic"], message)
+        elif self.udp is not None:
+            self.udp.send(message)
+        # 服务器 hello 之前音频通道尚未建立，此时的音频直接丢弃
+
+    def __aiter__(self):
+        return self._iter_messages()
+
+    async def _iter_messages(self):
+        while True:
+            message = await self._messages.get()
+            if message is None:
+                return
+            if isinstance(message, str):
+                try:
+                    data = json.loads(message)
+                except json.JSONDecodeError:
+                    data = None
+                if isinstance(data, dict):
+                    if data.get("type") == "hello" and "udp" in data:
+                        self.session_id = data.get("session_id", "")
+                        await self._open_udp(data.pop("udp"))
+                        # 密钥只在代理中使用，不转发给浏览器
+                        message = json.dumps(data)
+                    elif data.get("type") == "goodbye":
+                        logger.info(f"服务器结束会话: {data.get('session_id')}")
+                        self.session_id = ""
+                        return
+            yield message
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self.udp is not None:
+            logger.info(f"UDP 音频通道关闭，丢包 {self.udp.lost}，迟到丢弃 {self.udp.late}")
+            self.udp.close()
+        if self._client is not None:
+            if self.session_id:
+                self._client.publish(
+                    self.mqtt_info["publish_topic"],
+                    json.dumps({"type": "goodbye", "session_id": self.session_id}),
+                )
+            self._client.disconnect()
+            await asyncio.to_thread(self._client.loop_stop)
+        self._messages.put_nowait(None)
+
+
+def _set_result(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def _set_exception(future: asyncio.Future, error: Exception) -> None:
+    if not future.done():
+        future.set_exception(error)
@@ -1,8 +1,11 @@
 from urllib.parse import urlparse
-from .websocket_proxy import WebSocketProxy
 from ..config import ConfigManager
+from ..utils.logger import get_logger, setup_logging
+from ..utils.system_info import setup_opus
 import asyncio
 
+logger = get_logger(__name__)
+
 
 def cleanup(process):
     """清理进程"""
@@ -12,11 +15,64 @@ def cleanup(process):
         process = None
 
 
-def run_proxy():
-    """在单独的进程中运行代理服务器"""
+def _is_valid_device(entry) -> bool:
+    return isinstance(entry, dict) and bool(entry.get("device_id")) and bool(entry.get("client_id"))
+
+
+def ensure_device_identities(configuration: ConfigManager) -> None:
+    """
+    设备身份数不足 DEVICE_POOL_SIZE 时生成并写回 DEVICES
+
+    需要在主进程中、启动代理进程或 uvicorn worker 之前调用，
+    保证所有进程使用同一组身份，且重启后设备 MAC 保持不变（OTA 注册稳定）。
+    """
+    from .identity_pool import generate_identity
+
+    devices = list(configuration.get("DEVICES"))
+    valid = sum(1 for entry in devices if _is_valid_device(entry))
+    pool_size = configuration.get_int("DEVICE_POOL_SIZE")
+    if valid >= pool_size:
+        return
+    logger.info(f"正在生成 {pool_size - valid} 个新的设备身份")
+    devices.extend(generate_identity().to_dict() for _ in range(pool_size - valid))
+    configuration.update({"DEVICES": devices})
+
+
+def create_identity_pool(configuration: ConfigManager):
+    """根据配置创建设备身份池（身份由 ensure_device_identities 预先生成）"""
+    from .identity_pool import DeviceIdentity, IdentityPool
+
+    identities = []
+    for entry in configuration.get("DEVICES"):
+        if not _is_valid_device(entry):
+            logger.warning(f"忽略无效的设备身份配置: {entry}")
+            continue
+        identities.append(
+            DeviceIdentity(entry["device_id"], entry["client_id"], entry.get("token", ""))
+        )
+    if not identities:
+        identities.append(
+            DeviceIdentity(configuration.get_str("DEVICE_ID"), configuration.get_str("CLIENT_ID"))
+        )
+
+    return IdentityPool(
+        identities,
+        max_sessions=configuration.get_int("DEVICE_MAX_SESSIONS"),
+        sticky=configuration.get_bool("DEVICE_STICKY"),
+    )
+
+
+def create_proxy():
+    """根据配置创建代理实例（调用前需已执行 setup_opus）"""
+    # 代理依赖的 numpy / opuslib / websockets 只在代理进程中导入，避免拖慢主进程启动
+    from .websocket_proxy import WebSocketProxy
+    from ..utils.audio import OpusEncoderBounds
+    from ..utils.profiling import stage_timers
+
     configuration = ConfigManager()
+    stage_timers.enabled = configuration.get_bool("PROFILING_TIMERS")
     ws_proxy_url = configuration.get_str("WS_PROXY_URL")
-    proxy = WebSocketProxy(
+    return WebSocketProxy(
         device_id=configuration.get_str("DEVICE_ID"),
         client_id=configuration.get_str("CLIENT_ID"),
         websocket_url=configuration.get_str("WS_URL"),
@@ -24,6 +80,25 @@ def run_proxy():
         proxy_host=urlparse(ws_proxy_url).hostname,
         proxy_port=urlparse(ws_proxy_url).port,
         token_enable=configuration.get_bool("TOKEN_ENABLE"),
-        token=configuration.get_str("DEVICE_TOKEN"),
+        token=configuration.get_str("TOKEN"),
+        identity_pool=create_identity_pool(configuration),
+        profiling_enable=configuration.get_bool("PROFILING_ENABLE"),
+        profiling_token=configuration.get_str("PROFILING_TOKEN"),
+        upstream_transport=configuration.get_str("UPSTREAM_TRANSPORT"),
+        opus_bounds=OpusEncoderBounds(
+            min_bitrate=configuration.get_int("OPUS_MIN_BITRATE"),
+            max_bitrate=configuration.get_int("OPUS_MAX_BITRATE"),
+            min_complexity=configuration.get_int("OPUS_MIN_COMPLEXITY"),
+            max_complexity=configuration.get_int("OPUS_MAX_COMPLEXITY"),
+            min_frame_duration=configuration.get_int("OPUS_MIN_FRAME_DURATION"),
+            max_frame_duration=configuration.get_int("OPUS_MAX_FRAME_DURATION"),
+        ),
     )
+
+
+def run_proxy():
+    """在单独的进程中运行代理服务器"""
+    setup_logging()
+    setup_opus()  # 在导入 opuslib 之前 windows 需要手动加载 opus.dll 动态链接库
+    proxy = create_proxy()
     asyncio.run(proxy.main())
@@ -1,14 +1,77 @@
 import asyncio
+import struct
+import sys
 import websockets
 import json
 import numpy as np
-import requests
-from ..utils.device import get_mac_address, get_local_ip
+from urllib.parse import parse_qs, urlparse
+from .identity_pool import DeviceIdentity, IdentityPool
+from ..utils.device import get_local_ip
 from ..utils.logger import get_logger
-from ..utils.audio import pcm_to_opus, decoder, AudioProcessor
+from ..utils.profiling import (
+    PROFILE_TOKEN_HEADER,
+    check_profile_access,
+    handle_profile_command,
+    stage_timers,
+)
+from ..utils.audio import (
+    AdaptiveOpusEncoder,
+    AudioProcessor,
+    OpusEncoderBounds,
+    WavAssembler,
+)
 
 logger = get_logger(__name__)
 
+# 代理端口上分析控制接口的路径前缀（与 router/profile.py 中的 PROXY_PROFILE_PATH 一致）
+PROFILE_PATH_PREFIX = "/_profile/"
+
+# 通知浏览器立即停止播放已排队的语音
+INTERRUPTED_MESSAGE = json.dumps({"type": "tts", "state": "interrupted"})
+
+
+if sys.platform.startswith("linux"):
+    import fcntl
+
+# Linux SIOCOUTQNSD: 内核发送队列中尚未发出的字节数（不含已发出、等待确认的部分，
+# 否则刚发出的一帧总会被计为积压）
+SIOCOUTQNSD = 0x894B if sys.platform.startswith("linux") else None
+
+
+def send_backlog(connection) -> int:
+    """
+    上游连接中尚未送达的字节数：asyncio 写缓冲区 + 内核发送队列
+
+    asyncio 只在内核发送缓冲区写满后才开始缓冲，而内核缓冲区会自动增长到数 MB（tcp_wmem），
+    只看前者时要积压几十分钟的音频才能发现拥塞，因此在 Linux 上同时读取内核发送队列。
+    其他平台只能读到 asyncio 写缓冲区。
+    MQTT + UDP 上游没有 transport（UDP 拥塞时直接丢包而不会排队），始终返回 0，不会触发降码率。
+    """
+    transport = getattr(connection, "transport", None)
+    if transport is None:
+        return 0
+    queued = transport.get_write_buffer_size()
+    sock = transport.get_extra_info("socket")
+    if SIOCOUTQNSD is not None and sock is not None:
+        try:
+            queued += struct.unpack("i", fcntl.ioctl(sock.fileno(), SIOCOUTQNSD, b"\0" * 4))[0]
+        except OSError:
+            pass
+    return queued
+
+
+class ProxySession:
+    """单个浏览器连接的会话状态"""
+
+    def __init__(self, encoder: AdaptiveOpusEncoder, assembler: WavAssembler):
+        self.encoder = encoder
+        self.assembler = assembler  # 下行 Opus -> Wave 组装，解码器状态按会话独立
+        self.audio_lock = asyncio.Lock()  # 保证音频按顺序发送
+        self.discard_tts: bool = False  # 被打断后丢弃旧的 TTS 音频，直到下一次 tts start
+
+    def reset_audio(self) -> None:
+        self.assembler.reset()
+
 
 class WebSocketProxy:
     def __init__(
@@ -21,6 +84,11 @@ class WebSocketProxy:
         proxy_port: int | None,
         token_enable: bool,
         token: str,
+        opus_bounds: OpusEncoderBounds | None = None,
+        identity_pool: IdentityPool | None = None,
+        profiling_enable: bool = False,
+        profiling_token: str = "",
+        upstream_transport: str = "websocket",
     ):
         self.device_id= device_id
         self.client_id= client_id
@@ -30,26 +98,90 @@ class WebSocketProxy:
         self.proxy_port= proxy_port
         self.token_enable= token_enable
         self.token= token
-
-        self.audio_processor = AudioProcessor(960)
-        self.decoder = decoder
-        self.audio_buffer: bytearray = bytearray()  # 用于存储解码后的音频数据
-        self.is_first_audio: bool = True  # 用于判断是否创建 Wave 头信息
-        self.total_samples: int = 0  # 跟踪总采样数
-        self.audio_lock = asyncio.Lock()  # 保证音频按顺序发送
-
-        self.headers = {
-            "Device-Id": self.device_id,
-            "Client-Id": self.client_id,
+        self.opus_bounds = opus_bounds or OpusEncoderBounds()
+        self.profiling_enable = profiling_enable
+        self.profiling_token = profiling_token
+        self.upstream_transport = upstream_transport  # websocket 或 mqtt（MQTT 控制 + UDP 音频）
+
+        self.active_sessions: int = 0  # 当前连接的浏览器数
+        self.total_sessions: int = 0  # 启动以来的累计连接数
+
+        # 每个浏览器连接从身份池中租用一个设备身份，未配置时所有连接共用同一设备
+        self.identity_pool = identity_pool or IdentityPool(
+            [DeviceIdentity(self.device_id, self.client_id)]
+        )
+        if upstream_transport == "mqtt" and self.identity_pool.max_sessions != 1:
+            # MQTT 服务器按 client_id 只保留一个连接，同一身份的第二个会话会把第一个挤掉
+            logger.warning(
+                f"MQTT 模式下每个设备身份只能有一个会话，"
+                f"忽略 DEVICE_MAX_SESSIONS={self.identity_pool.max_sessions}"
+            )
+            self.identity_pool.max_sessions = 1
+        # 设备身份的 OTA 注册任务（按 device_id），在启动时并发进行或在首次租用时进行
+        self._registrations: dict[str, asyncio.Task] = {}
+
+    def build_headers(self, identity: DeviceIdentity) -> dict[str, str]:
+        """连接上游服务器时使用的请求头"""
+        headers = {
+            "Device-Id": identity.device_id,
+            "Client-Id": identity.client_id,
             "Protocol-Version": "1",
         }
         if self.token_enable:
-            self.headers["Authorization"] = f"Bearer {self.token}"
+            headers["Authorization"] = f"Bearer {identity.token or self.token}"
+        return headers
+
+    def connect_upstream(self, identity: DeviceIdentity):
+        """按配置的传输方式连接上游服务器，返回的连接都支持 async with / send / async for"""
+        if self.upstream_transport == "mqtt":
+            # 仅 MQTT 模式需要 paho-mqtt 与 cryptography
+            from .mqtt_udp import MqttUdpConnection
+
+            if not identity.mqtt_info:
+                raise ValueError(f"设备 {identity.device_id} 没有 MQTT 连接信息，请检查 OTA 服务器")
+            if identity.active > 1:
+                raise ValueError(f"设备 {identity.device_id} 已有 MQTT 会话，不能同时建立第二个")
+            return MqttUdpConnection(identity.mqtt_info)
+
+        headers = self.build_headers(identity)
+        logger.info(f"正在连接 websocket 服务器，请求头: {headers}")
+        return websockets.connect(self.websocket_url, extra_headers=headers)
+
+    async def register_identity(self, identity: DeviceIdentity) -> bool:
+        """
+        向 OTA 服务器注册设备身份，每个身份只注册一次；注册失败的身份从池中移除
+
+        返回:
+            bool: 是否注册成功
+        """
+        if identity.registered:
+            return True
+        task = self._registrations.get(identity.device_id)
+        if task is None:
+            # requests 是同步调用，放到线程中执行，多个身份可以同时注册
+            task = asyncio.ensure_future(asyncio.to_thread(self._update_ota_address, identity))
+            self._registrations[identity.device_id] = task
+        try:
+            identity.mqtt_info = await asyncio.shield(task)
+        except Exception as e:
+            logger.error(f"设备 {identity.device_id} OTA 注册失败，已从身份池中移除: {e}")
+            self.identity_pool.discard(identity)
+            return False
+        identity.registered = True
+        return True
 
-        self._update_ota_address()
+    async def register_identities(self) -> None:
+        """启动时并发注册身份池中的所有设备身份，总耗时约为一次 OTA 请求"""
+        identities = list(self.identity_pool.identities)
+        results = await asyncio.gather(*(self.register_identity(i) for i in identities))
+        logger.info(f"设备身份 OTA 注册完成: {sum(results)}/{len(identities)}")
+        if not any(results):
+            logger.error("所有设备身份均未能完成 OTA 注册，代理将拒绝所有连接")
 
-    def _update_ota_address(self):
-        MAC_ADDR = get_mac_address()
+    def _update_ota_address(self, identity: DeviceIdentity):
+        import requests  # 仅注册设备身份时使用，按需导入以加快代理进程启动
+
+        MAC_ADDR = identity.device_id
 
         headers = {"Device-Id": MAC_ADDR, "Content-Type": "application/json"}
 
@@ -60,7 +192,7 @@ class WebSocketProxy:
             "psram_size": 0,
             "minimum_free_heap_size": 8318916,  # 最小可用堆内存
             "mac_address": MAC_ADDR,  # 设备 MAC 地址
-            "uuid": self.client_id,
+            "uuid": identity.client_id,
             "chip_model_name": "esp32s3",  # 芯片型号
             "chip_info": {"model": 9, "cores": 2, "revision": 2, "features": 18},
             "application": {
@@ -95,6 +227,14 @@ class WebSocketProxy:
             # 解析 JSON 数据
             response_data = response.json()
 
+            # 新生成的设备需要在控制台输入验证码激活，否则连接时会被服务器拒绝
+            activation = response_data.get("activation")
+            if isinstance(activation, dict) and activation.get("code"):
+                logger.warning(
+                    f"设备 {MAC_ADDR} 尚未激活，请在控制台添加设备并输入验证码: "
+                    f"{activation['code']} ({activation.get('message', '')})"
+                )
+
             # 确保 MQTT 信息存在
             if "mqtt" in response_data:
                 logger.debug(f"MQTT 信息已更新:\n{json.dumps(response_data, indent=2, ensure_ascii=False)}")
@@ -115,57 +255,47 @@ class WebSocketProxy:
             logger.error(f"OTA 请求失败: {e}")
             raise ValueError("无法连接到 OTA 服务器，请检查网络连接")
 
-    def create_wav_header(self, total_samples):
-        """
-        创建 Wave 文件头, https://blog.csdn.net/shulianghan/article/details/117351966
-
-        参数:
-            total_samples (int): 音频数据的总采样数
-
-        返回:
-            bytearray: Wave 文件头的字节数组
-
-        """
-        header = bytearray(44)
-
-        # ========== The "RIFF" chunk descriptor ==========
-        header[0:4] = b"RIFF"
-        header[4:8] = (total_samples * 2 + 36).to_bytes(4, "little")
-        header[8:12] = b"WAVE"
-
-        # ========== The "fmt" sub-chunk ==========
-        header[12:16] = b"fmt "
-        header[16:20] = (16).to_bytes(4, "little")
-        header[20:22] = (1).to_bytes(2, "little")
-        header[22:24] = (1).to_bytes(2, "little")
-        header[24:28] = (16000).to_bytes(4, "little")
-        header[28:32] = (32000).to_bytes(4, "little")
-        header[32:34] = (2).to_bytes(2, "little")
-        header[34:36] = (16).to_bytes(2, "little")
-
-        # ========== The "data" sub-chunk ==========
-        header[36:40] = b"data"
-        header[40:44] = (total_samples * 2).to_bytes(4, "little")
-
-        return header
+    def _browser_key(self, websocket) -> str | None:
+        """粘性分配使用的浏览器标识：优先取连接地址中的 browser_id 参数，否则使用客户端 IP"""
+        query = parse_qs(urlparse(getattr(websocket, "path", "") or "").query)
+        if query.get("browser_id"):
+            return query["browser_id"][0]
+        remote_address = websocket.remote_address
+        return remote_address[0] if remote_address else None
 
     async def proxy_handler(self, websocket):
         """来自浏览器的 WebSocket 连接"""
+        browser_key = self._browser_key(websocket)
+        while True:
+            identity = self.identity_pool.acquire(browser_key)
+            if identity is None:
+                logger.warning(f"没有空闲的设备身份，拒绝连接: {websocket.remote_address}")
+                await websocket.close(1013, "no device identity available")
+                return
+            if await self.register_identity(identity):
+                break
+            # 注册失败的身份已被移除，换一个身份重试
+            self.identity_pool.release(identity)
+
+        self.active_sessions += 1
+        self.total_sessions += 1
         try:
             logger.info(
-                f"正在创建新的客户端 websocket 连接: {websocket.remote_address}"
+                f"正在创建新的客户端 websocket 连接: {websocket.remote_address}, "
+                f"设备: {identity.device_id}"
             )
-            async with websockets.connect(
-                self.websocket_url, extra_headers=self.headers
-            ) as server_ws:
-                logger.info(f"已连接至 websocket 服务器，请求头: {self.headers}")
+            async with self.connect_upstream(identity) as server_ws:
+                logger.info(f"已连接至上游服务器，传输方式: {self.upstream_transport}")
+
+                # 每个会话独立的上行编码器（按该会话的发送延迟自适应调整）和下行解码器
+                session = ProxySession(AdaptiveOpusEncoder(self.opus_bounds), WavAssembler())
 
                 # 创建任务
                 client_to_server = asyncio.create_task(
-                    self.handle_client_messages(websocket, server_ws)
+                    self.handle_client_messages(websocket, server_ws, session)
                 )
                 server_to_client = asyncio.create_task(
-                    self.handle_server_messages(server_ws, websocket)
+                    self.handle_server_messages(server_ws, websocket, session)
                 )
 
                 # 等待任意一个任务完成
@@ -181,126 +311,121 @@ class WebSocketProxy:
         except Exception as e:
             logger.error(f"代理失败: {e}")
         finally:
+            self.active_sessions -= 1
+            self.identity_pool.release(identity)
             logger.info("客户端连接关闭")
 
-    async def handle_server_messages(self, server_ws, client_ws):
+    async def interrupt(self, session: ProxySession, client_ws, server_ws, message):
+        """
+        打断当前回复：丢弃已缓冲的语音，向服务器转发 abort，
+        并通知浏览器停止播放队列中的语音
+        """
+        async with session.audio_lock:
+            session.reset_audio()
+            session.discard_tts = True
+        await client_ws.send(INTERRUPTED_MESSAGE)
+        await server_ws.send(message)
+        logger.info("用户打断，已丢弃待发送的语音")
+
+    async def flush_audio(self, session: ProxySession, client_ws):
+        """将已缓冲的语音作为一个完整的 Wave 文件发给浏览器，需在 audio_lock 内调用"""
+        wav = session.assembler.flush()
+        if wav is None:
+            return
+        start = stage_timers.start()
+        await client_ws.send(wav)
+        stage_timers.stop("client_send", start)
+
+    async def handle_server_messages(self, server_ws, client_ws, session: ProxySession):
         """处理来自 WebSocket 服务器的消息"""
         try:
             async for message in server_ws:
                 if isinstance(message, str):
                     try:
+                        start = stage_timers.start()
                         msg_data = json.loads(message)
-                        if (
-                            msg_data.get("type") == "tts"
-                            and msg_data.get("state") == "start"
-                        ):
-                            # 新的音频流开始，播放未发送完的语音并重置状态
-                            if len(self.audio_buffer) > 44:
-                                async with self.audio_lock:
-                                    chunk_size = (self.total_samples * 2 + 36).to_bytes(
-                                        4, "little"
-                                    )
-                                    subchunk2_size = (self.total_samples * 2).to_bytes(
-                                        4, "little"
-                                    )
-                                    self.audio_buffer[4:8] = chunk_size
-                                    self.audio_buffer[40:44] = subchunk2_size
-                                    await client_ws.send(bytes(self.audio_buffer))
-                            self.audio_buffer = bytearray()
-                            self.is_first_audio = True
-                            self.total_samples = 0
-                        elif (
-                            msg_data.get("type") == "tts"
-                            and msg_data.get("state") == "stop"
+                        stage_timers.stop("server_json", start)
+                        if msg_data.get("type") == "tts" and msg_data.get("state") in (
+                            "start",
+                            "stop",
                         ):
-                            # 音频流结束，发送剩余数据并重置状态
-                            if len(self.audio_buffer) > 44:
-                                async with self.audio_lock:
-                                    chunk_size = (self.total_samples * 2 + 36).to_bytes(
-                                        4, "little"
-                                    )
-                                    subchunk2_size = (self.total_samples * 2).to_bytes(
-                                        4, "little"
-                                    )
-                                    self.audio_buffer[4:8] = chunk_size
-                                    self.audio_buffer[40:44] = subchunk2_size
-                                    await client_ws.send(bytes(self.audio_buffer))
-                                    self.audio_buffer = bytearray()
-                                    self.is_first_audio = True
-                                    self.total_samples = 0
+                            # 新的音频流开始或音频流结束，先播放未发送完的语音
+                            async with session.audio_lock:
+                                await self.flush_audio(session, client_ws)
+                                if msg_data["state"] == "start":
+                                    session.discard_tts = False
 
                         await client_ws.send(message)
                     except json.JSONDecodeError:
                         await client_ws.send(message)
+                elif session.discard_tts:
+                    # 已被打断，丢弃旧回复的剩余音频（无需解码）
+                    continue
                 else:
-                    async with self.audio_lock:
+                    async with session.audio_lock:
+                        # 等待锁期间可能已被打断，需要在锁内再检查一次
+                        if session.discard_tts:
+                            continue
                         try:
-                            # 解码 Opus 音频数据
-                            pcm_data = self.decoder.decode(message, 960)
-
-                            if pcm_data:
-                                # 计算采样数
-                                samples = (
-                                    len(pcm_data) // 2
-                                )  # 16 位音频，每个采样 2 字节
-                                self.total_samples += samples
-
-                                # 如果是第一个音频片段，创建 Wave 头
-                                if self.is_first_audio:
-                                    self.audio_buffer.extend(
-                                        self.create_wav_header(self.total_samples)
-                                    )
-                                    self.is_first_audio = False
-
-                                # 追加音频数据
-                                self.audio_buffer.extend(pcm_data)
-
-                                # 当缓冲区达到一定大小时发送数据
-                                # Wave 头 + 32000 个音频采样数据 = 64044 字节
-                                # 一句简短的话一般为 64KB 的 Wave 音频文件
-                                if len(self.audio_buffer) >= 64044:
-                                    # 更新 Wave 头中的元数据
-                                    chunk_size = (self.total_samples * 2 + 36).to_bytes(
-                                        4, "little"
-                                    )
-                                    subchunk2_size = (self.total_samples * 2).to_bytes(
-                                        4, "little"
-                                    )
-                                    self.audio_buffer[4:8] = chunk_size
-                                    self.audio_buffer[40:44] = subchunk2_size
-
-                                    # 发送数据
-                                    await client_ws.send(bytes(self.audio_buffer))
-
-                                    # 完全重置缓冲区
-                                    self.audio_buffer = bytearray()
-                                    self.is_first_audio = True
-                                    self.total_samples = 0
+                            # 解码 Opus 音频数据，直接写入 Wave 缓冲区
+                            start = stage_timers.start()
+                            full = session.assembler.append(message)
+                            stage_timers.stop("opus_decode", start)
+
+                            # 当缓冲区达到一定大小时发送数据
+                            # Wave 头 + 32000 个音频采样数据 = 64044 字节
+                            # 一句简短的话一般为 64KB 的 Wave 音频文件
+                            if full:
+                                await self.flush_audio(session, client_ws)
 
                         except Exception as e:
                             logger.error(f"音频处理错误: {e}")
         except Exception as e:
             logger.error(f"服务端消息处理异常: {e}")
 
-    async def handle_client_messages(self, client_ws, server_ws):
+    async def handle_client_messages(self, client_ws, server_ws, session: ProxySession):
         """处理来自客户端的消息"""
+        encoder = session.encoder
+        audio_processor = AudioProcessor(encoder.frame_size)
         try:
             async for message in client_ws:
                 # 文字数据
                 if isinstance(message, str):
-                    await server_ws.send(message)
+                    start = stage_timers.start()
+                    try:
+                        msg_type = json.loads(message).get("type")
+                    except (json.JSONDecodeError, AttributeError):
+                        msg_type = None
+                    stage_timers.stop("client_json", start)
+                    # 浏览器检测到用户说话（或用户发送新消息）时发送 abort
+                    if msg_type == "abort":
+                        await self.interrupt(session, client_ws, server_ws, message)
+                    else:
+                        await server_ws.send(message)
                 # 音频数据
                 else:
                     try:
                         # 确保数据是 Float32Array 格式
                         audio_data = np.frombuffer(message, dtype=np.float32)
                         if len(audio_data) > 0:
-                            chunks = self.audio_processor.process_audio(
+                            # 帧长可能被编码器调整，下一批分帧按新帧长切分
+                            audio_processor.buffer_size = encoder.frame_size
+                            start = stage_timers.start()
+                            chunks = audio_processor.process_audio(
                                 audio_data.tobytes()
                             )
+                            stage_timers.stop("audio_process", start)
                             for chunk in chunks if chunks else []:
-                                opus_data = pcm_to_opus(chunk)
+                                start = stage_timers.start()
+                                opus_data = encoder.encode(chunk)
+                                stage_timers.stop("opus_encode", start)
+                                if opus_data is None:
+                                    continue
+                                start = stage_timers.start()
                                 await server_ws.send(opus_data)
+                                stage_timers.stop("server_send", start)
+                                # send() 只在写缓冲区超过高水位时才会阻塞，直接读取尚未送达的字节数
+                                encoder.record_backlog(send_backlog(server_ws))
                         else:
                             logger.warning("音频数据为空")
                     except Exception as e:
@@ -308,9 +433,34 @@ class WebSocketProxy:
         except Exception as e:
             logger.error(f"客户端信息处理异常: {e}")
 
+    async def process_control_request(self, path, request_headers):
+        """
+        代理端口上的分析控制接口（双进程模式下由 FastAPI 转发）：
+        GET /_profile/<command>?<params>，其余请求按 WebSocket 连接处理
+        """
+        parsed = urlparse(path)
+        if not parsed.path.startswith(PROFILE_PATH_PREFIX):
+            return None
+        denied = check_profile_access(
+            self.profiling_enable, self.profiling_token, request_headers.get(PROFILE_TOKEN_HEADER)
+        )
+        if denied is not None:
+            status, content = denied
+        else:
+            params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+            status, content = handle_profile_command(
+                parsed.path[len(PROFILE_PATH_PREFIX):], params
+            )
+        body = json.dumps(content, ensure_ascii=False).encode()
+        return status, [("Content-Type", "application/json")], body
+
     async def main(self):
         """启动代理服务器"""
+        await self.register_identities()
         async with websockets.serve(
-            self.proxy_handler, self.proxy_host, self.proxy_port
+            self.proxy_handler,
+            self.proxy_host,
+            self.proxy_port,
+            process_request=self.process_control_request,
         ):
             await asyncio.Future()
@@ -1,9 +1,11 @@
 from typing import Optional
+from urllib.parse import urlparse
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 from ..config import ConfigManager
 from ..constant.repsonse import BaseResponse
 from ..utils.logger import get_logger
+from .proxy import PROXY_PATH
 from pydantic import BaseModel, Field
 
 router = APIRouter(prefix="/config", tags=["config"])
@@ -15,12 +17,21 @@ class GetConfigResponse(BaseResponse):
     data: dict[str, str | int | bool]
 
 
+def get_ws_proxy_url() -> str | bool | None:
+    """单进程模式下代理挂载在 FastAPI 服务的 PROXY_PATH 路由上，https 的后端对应 wss"""
+    if configuration.get_str("PROXY_MODE") == "embedded":
+        backend_url = urlparse(configuration.get_str("BACKEND_URL"))
+        scheme = "wss" if backend_url.scheme == "https" else "ws"
+        return f"{scheme}://{backend_url.netloc}{PROXY_PATH}"
+    return configuration.get("WS_PROXY_URL")
+
+
 @router.get("", summary="获取配置信息", response_model=GetConfigResponse)
 def get_config():
-    logger.info("配置信息: ", configuration.config)
+    logger.info(f"配置信息: {dict(configuration.config)}")
     data = {
         "ws_url": configuration.get("WS_URL"),
-        "ws_proxy_url": configuration.get("WS_PROXY_URL"),
+        "ws_proxy_url": get_ws_proxy_url(),
         "ota_version_url": configuration.get("OTA_VERSION_URL"),
         "token_enable": configuration.get("TOKEN_ENABLE"),
         "token": configuration.get("TOKEN"),
@@ -46,11 +57,13 @@ class ConfigData(BaseModel):
 def update_config(data: ConfigData):
     logger.info(f"配置信息: {data}")
     try:
-        for key, value in data.model_dump().items():
-            if value != "" and value:
-                logger.info(f"key: {key}, value: {value}")
-                configuration.set(key, value)
-        configuration.save_config()
+        # 请求字段为小写，对应配置项的大写键名；未传或为空字符串的字段保持不变
+        values = {
+            key.upper(): value
+            for key, value in data.model_dump(exclude_unset=True).items()
+            if value is not None and value != ""
+        }
+        configuration.update(values)
         logger.info("配置信息更新成功")
         return JSONResponse(
             content={"message": "配置文件更新成功", "code": 0}, status_code=200
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode, urlparse
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from ..config import ConfigManager
+from ..utils.logger import get_logger
+from ..utils.profiling import PROFILE_TOKEN_HEADER, check_profile_access, handle_profile_command
+
+router = APIRouter(prefix="/profile", tags=["profile"])
+logger = get_logger(__name__)
+configuration = ConfigManager()
+
+# 与 WebSocketProxy.process_control_request 中的路径前缀保持一致
+PROXY_PROFILE_PATH = "/_profile/"
+
+
+def _forward_to_proxy(command: str, params: dict[str, str]) -> tuple[int, dict]:
+    """双进程模式：将分析命令转发到代理进程的控制接口"""
+    proxy_url = urlparse(configuration.get_str("WS_PROXY_URL"))
+    host = proxy_url.hostname
+    if host in (None, "0.0.0.0", "::"):
+        host = "127.0.0.1"
+    url = f"http://{host}:{proxy_url.port}{PROXY_PROFILE_PATH}{command}?{urlencode(params)}"
+    request = urllib.request.Request(
+        url, headers={PROFILE_TOKEN_HEADER: configuration.get_str("PROFILING_TOKEN")}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+    except (urllib.error.URLError, OSError, json.JSONDecodeError) as e:
+        logger.error(f"转发分析命令失败: {e}")
+        return 502, {"message": f"无法连接代理进程: {e}", "code": 1}
+
+
+async def _dispatch(request: Request, command: str) -> JSONResponse:
+    denied = check_profile_access(
+        configuration.get_bool("PROFILING_ENABLE"),
+        configuration.get_str("PROFILING_TOKEN"),
+        request.headers.get(PROFILE_TOKEN_HEADER),
+    )
+    if denied is not None:
+        status, content = denied
+        return JSONResponse(content=content, status_code=status)
+
+    params = dict(request.query_params)
+    if getattr(request.app.state, "proxy", None) is not None:
+        # 单进程模式：在当前 worker 的事件循环线程中执行
+        status, content = handle_profile_command(command, params)
+    else:
+        status, content = await asyncio.to_thread(_forward_to_proxy, command, params)
+    return JSONResponse(content=content, status_code=status)
+
+
+@router.post("/cpu/start", summary="开始采样分析（参数 seconds、interval_ms、pid）")
+async def start_cpu_profile(request: Request):
+    return await _dispatch(request, "cpu/start")
+
+
+@router.post("/cpu/stop", summary="提前停止采样分析")
+async def stop_cpu_profile(request: Request):
+    return await _dispatch(request, "cpu/stop")
+
+
+@router.get("/cpu/result", summary="获取采样结果（折叠栈格式）")
+async def get_cpu_profile(request: Request):
+    return await _dispatch(request, "cpu/result")
+
+
+@router.get("/timers", summary="获取热路径阶段耗时（参数 reset）")
+async def get_stage_timers(request: Request):
+    return await _dispatch(request, "timers")
+
+
+@router.post("/timers/enable", summary="开启或关闭热路径阶段计时（参数 enabled）")
+async def enable_stage_timers(request: Request):
+    return await _dispatch(request, "timers/enable")
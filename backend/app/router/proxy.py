@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Request, WebSocket
+from fastapi.responses import JSONResponse
+from ..constant.repsonse import BaseResponse
+from ..proxy.asgi_adapter import ASGIWebSocketAdapter
+from ..utils.logger import get_logger
+
+PROXY_PATH = "/proxy"
+
+router = APIRouter(tags=["proxy"])
+logger = get_logger(__name__)
+
+
+@router.websocket(PROXY_PATH)
+async def proxy_websocket(websocket: WebSocket):
+    """单进程模式下的 WebSocket 代理入口"""
+    await websocket.accept()
+    try:
+        await websocket.app.state.proxy.proxy_handler(ASGIWebSocketAdapter(websocket))
+    finally:
+        try:
+            await websocket.close()
+        except RuntimeError:
+            # 浏览器已主动断开
+            pass
+
+
+class GetProxyStatsResponse(BaseResponse):
+    data: dict[str, int]
+
+
+@router.get(
+    PROXY_PATH + "/stats", summary="获取代理运行状态", response_model=GetProxyStatsResponse
+)
+def get_proxy_stats(request: Request):
+    proxy = request.app.state.proxy
+    data = {
+        "active_sessions": proxy.active_sessions,
+        "total_sessions": proxy.total_sessions,
+        **proxy.identity_pool.stats(),
+    }
+    return JSONResponse(
+        content={"message": "代理状态获取成功", "code": 0, "data": data},
+        status_code=200,
+    )
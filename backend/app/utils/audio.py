@@ -1,5 +1,8 @@
+import ctypes
 import io
+import struct
 import sys
+import time
 import wave
 import numpy as np
 from .logger import get_logger
@@ -53,6 +56,258 @@ def pcm_to_opus(pcm_data: bytes) -> bytes | None:
         return None
 
 
+class OpusEncoderBounds:
+    """自适应 Opus 编码参数的取值范围"""
+
+    FRAME_DURATIONS = (20, 40, 60)  # 毫秒
+    BITRATE_RANGE = (500, 512000)  # libopus 接受的码率范围
+
+    def __init__(
+        self,
+        min_bitrate: int = 12000,
+        max_bitrate: int = 32000,
+        min_complexity: int = 2,
+        max_complexity: int = 10,
+        min_frame_duration: int = 60,
+        max_frame_duration: int = 60,
+    ):
+        low, high = self.BITRATE_RANGE
+        self.min_bitrate = max(low, min(min_bitrate, high))
+        self.max_bitrate = max(self.min_bitrate, min(max_bitrate, high))
+        self.min_complexity = max(0, min(min_complexity, 10))
+        self.max_complexity = max(self.min_complexity, min(max_complexity, 10))
+        self.frame_durations = [
+            d for d in self.FRAME_DURATIONS if min_frame_duration <= d <= max_frame_duration
+        ] or [60]
+
+
+class AdaptiveOpusEncoder:
+    """
+    按会话自适应调整 Opus 编码参数
+
+    根据上行发送队列的积压（换算为按当前码率需要多久才能发完）和进程 CPU 占用，
+    在 bounds 范围内调整码率、编码复杂度和帧长：负载高时优先降低复杂度，上行拥塞时
+    优先降低码率，两者都已到下限时改用更长的帧；负载恢复后依次回升码率、复杂度，
+    最后缩短帧长。
+    """
+
+    def __init__(
+        self,
+        bounds: OpusEncoderBounds,
+        sample_rate: int = 16000,
+        channels: int = 1,
+        adjust_interval: float = 1.0,
+        backlog_high: float = 0.12,
+        backlog_low: float = 0.01,
+        cpu_high: float = 0.8,
+        cpu_low: float = 0.5,
+    ):
+        self.bounds = bounds
+        self.sample_rate = sample_rate
+        self.adjust_interval = adjust_interval
+        self.backlog_high = backlog_high
+        self.backlog_low = backlog_low
+        self.cpu_high = cpu_high
+        self.cpu_low = cpu_low
+
+        self.encoder = opuslib.Encoder(sample_rate, channels, "voip")
+        self.bitrate = bounds.max_bitrate
+        self.complexity = bounds.max_complexity
+        self.frame_duration = bounds.frame_durations[-1]
+        self._apply()
+
+        self.send_backlog = 0.0  # 发送队列积压（秒）的指数滑动平均
+        self._last_adjust = time.monotonic()
+        self._last_cpu = time.process_time()
+
+    @property
+    def frame_size(self) -> int:
+        """当前帧长对应的采样数"""
+        return self.sample_rate * self.frame_duration // 1000
+
+    def encode(self, pcm_data: bytes) -> bytes | None:
+        try:
+            return self.encoder.encode(pcm_data, len(pcm_data) // 2)
+        except opuslib.OpusError as e:
+            logger.error(f"Opus 编码错误: {e}, 数据长度: {len(pcm_data)}")
+            return None
+
+    def record_backlog(self, queued_bytes: int) -> None:
+        """
+        记录一次上行发送后尚未送达的字节数，并按周期调整编码参数
+
+        参数:
+            queued_bytes (int): 上游连接中积压的字节数（asyncio 写缓冲区 + 内核发送队列，
+                见 websocket_proxy.send_backlog）
+        """
+        backlog = queued_bytes * 8 / self.bitrate
+        self.send_backlog = 0.8 * self.send_backlog + 0.2 * backlog
+
+        now = time.monotonic()
+        elapsed = now - self._last_adjust
+        if elapsed < self.adjust_interval:
+            return
+        cpu_now = time.process_time()
+        cpu_load = (cpu_now - self._last_cpu) / elapsed
+        self._last_adjust = now
+        self._last_cpu = cpu_now
+        self._adjust(cpu_load)
+
+    def _adjust(self, cpu_load: float) -> None:
+        bounds = self.bounds
+        durations = bounds.frame_durations
+        index = durations.index(self.frame_duration)
+        overloaded = cpu_load > self.cpu_high
+        congested = self.send_backlog > self.backlog_high
+
+        if overloaded or congested:
+            if overloaded and self.complexity > bounds.min_complexity:
+                self.complexity = max(bounds.min_complexity, self.complexity - 2)
+            elif congested and self.bitrate > bounds.min_bitrate:
+                self.bitrate = max(bounds.min_bitrate, int(self.bitrate * 0.75))
+            elif index < len(durations) - 1:
+                self.frame_duration = durations[index + 1]
+            else:
+                return
+        elif cpu_load < self.cpu_low and self.send_backlog < self.backlog_low:
+            if self.bitrate < bounds.max_bitrate:
+                self.bitrate = min(bounds.max_bitrate, int(self.bitrate * 1.25))
+            elif self.complexity < bounds.max_complexity:
+                self.complexity = min(bounds.max_complexity, self.complexity + 1)
+            elif index > 0:
+                self.frame_duration = durations[index - 1]
+            else:
+                return
+        else:
+            return
+
+        self._apply()
+        logger.info(
+            f"调整 Opus 编码参数: bitrate={self.bitrate}, complexity={self.complexity}, "
+            f"frame_duration={self.frame_duration}ms "
+            f"(cpu={cpu_load:.2f}, send_backlog={self.send_backlog * 1000:.1f}ms)"
+        )
+
+    def _apply(self) -> None:
+        self.encoder.bitrate = self.bitrate
+        self.encoder.complexity = self.complexity
+
+
+# Wave 文件头: RIFF 块 + fmt 子块（PCM）+ data 子块头，共 44 字节
+WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+WAV_HEADER_SIZE = WAV_HEADER.size
+
+
+class WavAssembler:
+    """
+    下行语音组装：将服务器发来的 Opus 包解码为 PCM，拼成完整的 Wave 文件发给浏览器
+
+    缓冲区按 "44 字节 Wave 头 + flush_bytes + 一帧" 一次性分配，Opus 直接解码到
+    头部之后的写入位置，发送前用预编译的 struct 原地写入 Wave 头，再以 memoryview
+    交给 WebSocket 发送，整个过程不分配新的缓冲区也不复制音频数据。
+
+    发送时机:
+        - 缓冲的音频达到 flush_bytes 时（append 返回 True）
+        - tts start / tts stop 时，发送尚未发出的剩余音频
+    每次 flush 后重新开始一个新的 Wave 文件；发送的 memoryview 在下一次 append
+    之前有效，调用方需在此之前完成发送。
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        channels: int = 1,
+        frame_size: int = 960,
+        flush_bytes: int = 64000,
+    ):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frame_size = frame_size
+        self.flush_bytes = flush_bytes
+        self.decoder = opuslib.Decoder(sample_rate, channels)
+
+        self._frame_samples = frame_size * channels
+        self._buffer = bytearray(WAV_HEADER_SIZE + flush_bytes + self._frame_samples * 2)
+        self._view = memoryview(self._buffer)
+        self._length = WAV_HEADER_SIZE  # 当前写入位置（含 Wave 头）
+
+        # opuslib 的 Decoder.decode 每次都会新建缓冲区并复制两次结果，
+        # 直接调用底层 opus_decode 写入预分配的缓冲区；不可用时退回 decode + 切片赋值
+        libopus = getattr(getattr(opuslib, "api", None), "libopus", None)
+        self._opus_decode = None
+        if libopus is not None:
+            # 单独取一个函数对象并以裸地址传参，每个包不必再创建 ctypes 指针或数组对象
+            self._opus_decode = libopus["opus_decode"]
+            self._opus_decode.argtypes = (
+                ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int32,
+                ctypes.c_void_p, ctypes.c_int, ctypes.c_int,
+            )
+            self._opus_decode.restype = ctypes.c_int
+            self._state_address = ctypes.cast(self.decoder.decoder_state, ctypes.c_void_p).value
+            # 缓冲区大小固定，导出后地址不变
+            self._pcm = (ctypes.c_char * len(self._buffer)).from_buffer(self._buffer)
+            self._buffer_address = ctypes.addressof(self._pcm)
+
+    @property
+    def pending_bytes(self) -> int:
+        """已缓冲、尚未发送的 PCM 字节数"""
+        return self._length - WAV_HEADER_SIZE
+
+    def append(self, opus_data: bytes) -> bool:
+        """
+        解码一个 Opus 包并追加到缓冲区
+
+        返回:
+            bool: 缓冲的音频是否已达到 flush_bytes，需要调用 flush 发送
+
+        异常:
+            BufferError: 上一次返回 True 后没有调用 flush，缓冲区已放不下一帧
+        """
+        offset = self._length
+        # opus_decode 按裸地址写入、不检查边界，必须先确认剩余空间足够一帧
+        if offset + self._frame_samples * 2 > len(self._buffer):
+            raise BufferError("Wave 缓冲区已满，需要先调用 flush")
+        if self._opus_decode is not None:
+            samples = self._opus_decode(
+                self._state_address, opus_data, len(opus_data),
+                self._buffer_address + offset, self.frame_size, 0,
+            )
+            if samples < 0:
+                raise opuslib.OpusError(samples)
+            size = samples * self.channels * 2
+        else:
+            pcm_data = self.decoder.decode(opus_data, self.frame_size)
+            size = len(pcm_data)
+            self._buffer[offset : offset + size] = pcm_data
+        self._length = offset + size
+        return self.pending_bytes >= self.flush_bytes
+
+    def flush(self) -> memoryview | None:
+        """
+        写入 Wave 头并取出当前的 Wave 文件，随后开始新的文件
+
+        返回:
+            memoryview | None: 完整的 Wave 文件；没有待发送的音频时返回 None
+        """
+        data_size = self.pending_bytes
+        if data_size <= 0:
+            return None
+        WAV_HEADER.pack_into(
+            self._buffer, 0,
+            b"RIFF", data_size + 36, b"WAVE",
+            b"fmt ", 16, 1, self.channels, self.sample_rate,
+            self.sample_rate * self.channels * 2, self.channels * 2, 16,
+            b"data", data_size,
+        )
+        wav = self._view[: self._length]
+        self._length = WAV_HEADER_SIZE
+        return wav
+
+    def reset(self) -> None:
+        """丢弃已缓冲的音频（如被打断时）"""
+        self._length = WAV_HEADER_SIZE
+
+
 class AudioProcessor:
     def __init__(self, buffer_size):
         self.buffer_size: int = buffer_size
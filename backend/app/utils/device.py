@@ -1,16 +1,14 @@
 import uuid
 import socket
+from functools import lru_cache
 from .logger import get_logger
 
 logger = get_logger(__name__)
 
 
+@lru_cache(maxsize=1)
 def get_mac_address() -> str:
-    """获取设备的唯一标识符"""
-    mac_hex = uuid.UUID(int=uuid.getnode()).hex[-12:]
-
-    mac_address = ":".join([mac_hex[i : i + 2] for i in range(0, 12, 2)])
-
+    """获取设备的唯一标识符（uuid.getnode 可能调用系统命令，结果在进程内缓存）"""
     try:
         # 获取设备的唯一标识符并转换为十六进制字符串
         node = uuid.getnode()
@@ -1,14 +1,21 @@
 import os
 from logging.handlers import RotatingFileHandler
 import logging
-from colorlog import ColoredFormatter
 from ..constant.file import BASE_DIR
 
+_log_file: str | None = None
+
 
 def setup_logging():
     """
-    配置日志
+    配置日志，同一进程内只初始化一次（fork 出的子进程会继承父进程的配置）
     """
+    global _log_file
+    if _log_file is not None:
+        return _log_file
+
+    from colorlog import ColoredFormatter
+
     log_dir = os.path.join(BASE_DIR, "logs")
     os.makedirs(log_dir, exist_ok=True)
 
@@ -61,6 +68,7 @@ def setup_logging():
     # 输出日志配置信息
     logging.info("日志系统初始化完毕，路径: %s", log_file)
 
+    _log_file = log_file
     return log_file
 
 
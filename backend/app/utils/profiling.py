@@ -0,0 +1,226 @@
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+MAX_PROFILE_SECONDS = 300
+PROFILE_TOKEN_HEADER = "X-Profiling-Token"
+
+
+class StageTimers:
+    """
+    热路径各阶段的耗时统计
+
+    用法:
+        start = stage_timers.start()
+        ...
+        stage_timers.stop("opus_decode", start)
+
+    关闭时 start() 返回 0，stop() 直接返回，开销只有两次函数调用。
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._stats: dict[str, list] = {}  # stage -> [count, total, max]
+
+    def start(self) -> float:
+        return time.perf_counter() if self.enabled else 0.0
+
+    def stop(self, stage: str, start: float) -> None:
+        if not start:
+            return
+        elapsed = time.perf_counter() - start
+        stat = self._stats.get(stage)
+        if stat is None:
+            self._stats[stage] = [1, elapsed, elapsed]
+            return
+        stat[0] += 1
+        stat[1] += elapsed
+        if elapsed > stat[2]:
+            stat[2] = elapsed
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        return {
+            stage: {
+                "count": count,
+                "total_ms": total * 1000,
+                "avg_us": total / count * 1e6,
+                "max_us": max_ * 1e6,
+            }
+            for stage, (count, total, max_) in self._stats.items()
+        }
+
+    def reset(self) -> None:
+        self._stats = {}
+
+
+stage_timers = StageTimers()
+
+
+class SamplingProfiler:
+    """
+    采样分析器：后台线程定时采集目标线程（事件循环所在线程）的调用栈，
+    输出 flamegraph.pl / speedscope 可直接读取的折叠栈（collapsed stacks）格式
+    """
+
+    def __init__(self):
+        self._thread: threading.Thread | None = None
+        self._stop_event = threading.Event()
+        self._samples: Counter[str] = Counter()
+        self.started_at: float = 0.0
+        self.duration: float = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, interval: float, thread_id: int | None = None) -> None:
+        """
+        开始采样，seconds 秒后自动停止
+
+        参数:
+            seconds (float): 采样时长
+            interval (float): 采样间隔（秒）
+            thread_id (int | None): 目标线程，默认为调用方所在线程
+        """
+        if self.running:
+            raise RuntimeError("采样已在进行中")
+        target = thread_id if thread_id is not None else threading.get_ident()
+        self._samples = Counter()
+        self._stop_event.clear()
+        self.started_at = time.time()
+        self.duration = 0.0
+        self._thread = threading.Thread(
+            target=self._run, args=(target, seconds, interval), name="SamplingProfiler", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"开始采样: {seconds}s, 间隔 {interval * 1000:.1f}ms")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, target: int, seconds: float, interval: float) -> None:
+        start = time.monotonic()
+        deadline = start + seconds
+        while not self._stop_event.wait(interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(target)
+            if frame is None:
+                break
+            self._samples[self._collapse(frame)] += 1
+        self.duration = time.monotonic() - start
+        logger.info(f"采样结束: {sum(self._samples.values())} 个样本")
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            name = getattr(code, "co_qualname", code.co_name)
+            stack.append(f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def collapsed(self) -> str:
+        """折叠栈文本，每行为 "frame;frame;... count" """
+        # 采样线程可能仍在写入，先复制一份（dict 复制在 GIL 下是原子的）
+        samples = dict(self._samples)
+        return "\n".join(
+            f"{stack} {count}" for stack, count in sorted(samples.items(), key=lambda x: -x[1])
+        )
+
+    def sample_count(self) -> int:
+        return sum(dict(self._samples).values())
+
+
+sampling_profiler = SamplingProfiler()
+
+
+def check_profile_access(
+    enabled: bool, token: str, provided: str | None
+) -> tuple[int, dict] | None:
+    """
+    校验分析接口的访问权限，供 FastAPI 路由和代理进程的控制接口共用
+
+    参数:
+        enabled (bool): 配置项 PROFILING_ENABLE
+        token (str): 配置项 PROFILING_TOKEN
+        provided (str | None): 请求头 X-Profiling-Token 的值
+
+    返回:
+        tuple[int, dict] | None: 拒绝时返回 HTTP 状态码与响应内容，允许时返回 None
+    """
+    if not enabled:
+        return 403, {"message": "分析接口未开启", "code": 1}
+    if not token:
+        return 403, {"message": "未设置 PROFILING_TOKEN，分析接口不可用", "code": 1}
+    if not provided or not hmac.compare_digest(provided.encode(), token.encode()):
+        return 401, {"message": "分析接口令牌无效", "code": 1}
+    return None
+
+
+def _parse_bool(value: str | None) -> bool:
+    return (value or "").lower() in ("true", "1", "yes", "on")
+
+
+def handle_profile_command(command: str, params: dict[str, str]) -> tuple[int, dict]:
+    """
+    执行分析命令，供 FastAPI 路由（单进程模式）和代理进程的控制端口共用；
+    cpu/start 需要在事件循环所在线程中调用
+
+    参数 pid 不为空时只在该进程中执行。
+
+    命令:
+        cpu/start    参数 seconds、interval_ms，开始采样
+        cpu/stop     提前停止采样
+        cpu/result   获取折叠栈结果
+        timers       获取阶段耗时，参数 reset=true 时获取后清零
+        timers/enable 参数 enabled=true/false，开启或关闭阶段计时
+
+    返回:
+        tuple[int, dict]: HTTP 状态码与响应内容；参数无效时为 400，
+            请求未落在指定 worker 上或采样已在进行中时为 409
+    """
+    data: dict = {"pid": os.getpid()}
+    try:
+        # 单进程多 worker 时请求可能落在其他 worker 上，由调用方重试
+        if params.get("pid") and int(params["pid"]) != os.getpid():
+            return 409, {"message": "请求未落在指定的 worker 上，请重试", "code": 2, "data": data}
+
+        if command == "cpu/start":
+            seconds = min(float(params.get("seconds", 10)), MAX_PROFILE_SECONDS)
+            interval = float(params.get("interval_ms", 5)) / 1000
+            if seconds <= 0 or interval <= 0:
+                raise ValueError("seconds 和 interval_ms 必须大于 0")
+            sampling_profiler.start(seconds, interval)
+            data["seconds"] = seconds
+        elif command == "cpu/stop":
+            sampling_profiler.stop()
+        elif command == "cpu/result":
+            data["running"] = sampling_profiler.running
+            data["duration"] = sampling_profiler.duration
+            data["samples"] = sampling_profiler.sample_count()
+            data["collapsed"] = sampling_profiler.collapsed()
+        elif command == "timers":
+            data["enabled"] = stage_timers.enabled
+            data["stages"] = stage_timers.snapshot()
+            if _parse_bool(params.get("reset")):
+                stage_timers.reset()
+        elif command == "timers/enable":
+            stage_timers.enabled = _parse_bool(params.get("enabled"))
+            data["enabled"] = stage_timers.enabled
+        else:
+            return 404, {"message": f"未知的分析命令: {command}", "code": 1}
+    except ValueError as e:
+        # 参数无效（如 seconds=abc）
+        return 400, {"message": str(e), "code": 1, "data": data}
+    except RuntimeError as e:
+        # 与当前状态冲突（如采样已在进行中）
+        return 409, {"message": str(e), "code": 1, "data": data}
+    return 200, {"message": "ok", "code": 0, "data": data}
@@ -5,17 +5,64 @@ import os
 import sys
 import platform
 from ..utils.logger import get_logger
-from ..constant.file import BASE_DIR
+from ..constant.file import BASE_DIR, CONFIG_DIR, OPUS_CACHE_FILE
 
 logger = get_logger(__name__)
 
+# 环境变量，子进程可直接复用父进程解析出的 opus 路径
+OPUS_PATH_ENV = "XIAOZHI_OPUS_PATH"
+
 
 def setup_opus():
     """设置 opus 动态库"""
     if hasattr(sys, "_opus_loaded"):
         logger.info("opus 库已由其他组件加载")
         return True
-    
+
+    opus_path = _resolve_opus_path()
+    if opus_path is not None and not _load_opus(opus_path):
+        # 缓存的路径可能已失效，清除缓存后重新查找一次（项目自带的库 -> 系统路径）
+        _clear_opus_cache()
+        opus_path = _resolve_opus_path()
+        if opus_path is not None and not _load_opus(opus_path):
+            _clear_opus_cache()
+            opus_path = None
+    if opus_path is None:
+        logger.info("确保 opus 动态库已正确安装或位于正确的位置")
+        return False
+
+    logger.info(f"成功加载 opus 库: {opus_path}")
+    setattr(sys, "_opus_loaded", True)
+    os.environ[OPUS_PATH_ENV] = opus_path
+    # 成功加载后修补 find_library，避免 opuslib 导入时再次扫描系统库
+    _patch_find_library("opus", opus_path)
+    return True
+
+
+def _load_opus(opus_path: str) -> bool:
+    """预加载 opus 库"""
+    try:
+        ctypes.cdll.LoadLibrary(opus_path)
+        return True
+    except Exception as e:
+        logger.info(f"加载 opus 库失败: {e}")
+        return False
+
+
+def _resolve_opus_path() -> str | None:
+    """
+    解析 opus 动态库路径，按以下顺序查找：
+    环境变量 -> 本地缓存 -> 项目自带的库文件 -> 系统路径
+
+    系统路径查找（ctypes.util.find_library）在 Linux 上会调用 ldconfig/gcc 子进程，
+    耗时较长，因此只在首次启动时执行一次，结果写入缓存文件。
+    """
+    cached_path = os.environ.get(OPUS_PATH_ENV) or _read_opus_cache()
+    # find_library 在 Linux 上返回的是库名（如 libopus.so.0），无法按路径校验
+    if cached_path and (not os.path.isabs(cached_path) or os.path.exists(cached_path)):
+        logger.info(f"使用已缓存的 opus 库路径: {cached_path}")
+        return cached_path
+
     system = platform.system().lower()
     logger.info(f"当前操作系统: {system}")
     if system == "windows":
@@ -26,39 +73,52 @@ def setup_opus():
         sys_dir = "linux"
     else:
         logger.info(f"不支持的操作系统: {system}")
-        return False
+        return None
 
     # 获取 opus 动态链接库路径
     opus_path = os.path.join(BASE_DIR, "libs", sys_dir, f"opus.{opus_ext}")
-
-    # 检查文件是否存在
     if os.path.exists(opus_path):
         logger.info(f"找到 opus 库文件: {opus_path}")
-    else:
-        logger.info(f"警告: opus 库文件不存在于路径: {opus_path}")
+        _write_opus_cache(opus_path)
+        return opus_path
+    logger.info(f"警告: opus 库文件不存在于路径: {opus_path}")
+
+    # 尝试使用系统路径查找
+    import ctypes.util
+
+    system_path = ctypes.util.find_library("opus")
+    if system_path is None:
+        logger.info("从系统路径查找 opus 库失败")
+        return None
 
-    # 预加载 opus.dll
+    logger.info(f"已从系统路径找到 opus 库: {system_path}")
+    _write_opus_cache(system_path)
+    return system_path
+
+
+def _read_opus_cache() -> str | None:
     try:
-        ctypes.cdll.LoadLibrary(opus_path)
-        logger.info(f"成功加载 opus 库: {opus_path}")
-        setattr(sys, "_opus_loaded", True)
-        # 成功加载后修补 find_library
-        _patch_find_library("opus", opus_path)
-        return True
-    except Exception as e:
-        logger.info(f"加载 opus 库失败: {e}")
+        with open(OPUS_CACHE_FILE, "r") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
 
-        # 尝试使用系统路径查找
-        try:
-            ctypes.cdll.LoadLibrary("opus")
-            logger.info("已从系统路径加载 opus 库")
-            setattr(sys, "_opus_loaded", True)
-            return True
-        except Exception as e2:
-            logger.info(f"从系统路径加载 opus 库失败: {e2}")
 
-        logger.info("确保 opus 动态库已正确安装或位于正确的位置")
-        return False
+def _write_opus_cache(opus_path: str) -> None:
+    try:
+        os.makedirs(CONFIG_DIR, exist_ok=True)
+        with open(OPUS_CACHE_FILE, "w") as f:
+            f.write(opus_path)
+    except OSError as e:
+        logger.warning(f"写入 opus 库路径缓存失败: {e}")
+
+
+def _clear_opus_cache() -> None:
+    os.environ.pop(OPUS_PATH_ENV, None)
+    try:
+        os.remove(OPUS_CACHE_FILE)
+    except OSError:
+        pass
 
 
 def _patch_find_library(lib_name, lib_path):
@@ -66,10 +126,13 @@ def _patch_find_library(lib_name, lib_path):
     import ctypes.util
 
     original_find_library = ctypes.util.find_library
+    if getattr(original_find_library, "_patched_lib", None) == lib_name:
+        return
 
     def patched_find_library(name):
         if name == lib_name:
             return lib_path
         return original_find_library(name)
 
+    setattr(patched_find_library, "_patched_lib", lib_name)
     ctypes.util.find_library = patched_find_library
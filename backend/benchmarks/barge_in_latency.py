@@ -0,0 +1,103 @@
+"""
+打断延迟基准：测量从浏览器发送 abort 到下行语音静音的耗时
+
+用法（在 backend 目录下执行）:
+    python benchmarks/barge_in_latency.py
+    python benchmarks/barge_in_latency.py --rounds 20
+
+脚本在本地启动一个模拟的小智服务器（持续推送 TTS 语音，收到 abort 后停止），
+并启动指向它的 WebSocketProxy，模拟浏览器在收到语音后发送 abort，统计：
+    - abort -> 收到 interrupted 通知的耗时（前端据此立即停止播放并清空播放队列）
+    - abort -> 最后一帧旧语音到达的耗时（abort 之后、下一次 tts start 之前收到的语音帧）
+    - interrupt-to-silence：两者中较晚的一个，即浏览器从此不再有旧语音可播放的时刻
+    - interrupted 之后仍收到的旧语音帧数（会被播放出来），不为 0 时以非零状态码退出
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+import websockets
+
+from standin import HOST, PROXY_PORT, UPSTREAM_PORT, StandInServer, create_local_proxy
+
+
+async def measure_once() -> tuple[float, float | None, int]:
+    """
+    返回:
+        tuple: abort -> interrupted 的耗时、abort -> 最后一帧旧语音的耗时（没有时为 None）、
+            interrupted 之后收到的旧语音帧数
+    """
+    async with websockets.connect(f"ws://{HOST}:{PROXY_PORT}") as client:
+        await client.send(json.dumps({"type": "listen", "state": "detect", "text": "hi"}))
+
+        # 等待第一段语音到达后打断
+        while not isinstance(await client.recv(), bytes):
+            pass
+        start = time.perf_counter()
+        await client.send(json.dumps({"type": "abort", "session_id": ""}))
+
+        latency = None
+        last_audio = None
+        stale_audio = 0
+        deadline = start + 1.0
+        while time.perf_counter() < deadline:
+            try:
+                message = await asyncio.wait_for(client.recv(), deadline - time.perf_counter())
+            except asyncio.TimeoutError:
+                break
+            if isinstance(message, bytes):
+                last_audio = time.perf_counter() - start
+                if latency is not None:
+                    stale_audio += 1
+            elif json.loads(message).get("state") == "interrupted" and latency is None:
+                latency = time.perf_counter() - start
+        if latency is None:
+            raise RuntimeError("未收到 interrupted 通知")
+        return latency, last_audio, stale_audio
+
+
+def summarize(values: list[float]) -> str:
+    return (
+        f"mean {statistics.mean(values):.2f} ms, "
+        f"p50 {statistics.median(values):.2f} ms, max {max(values):.2f} ms"
+    )
+
+
+async def run(rounds: int) -> None:
+    upstream = StandInServer()
+    proxy = create_local_proxy()
+    async with websockets.serve(upstream.handler, HOST, UPSTREAM_PORT):
+        async with websockets.serve(proxy.proxy_handler, HOST, PROXY_PORT):
+            notices = []
+            last_audio = []
+            silences = []
+            stale_total = 0
+            for _ in range(rounds):
+                latency, audio_latency, stale_audio = await measure_once()
+                notices.append(latency * 1000)
+                if audio_latency is not None:
+                    last_audio.append(audio_latency * 1000)
+                silences.append(max(latency, audio_latency or 0) * 1000)
+                stale_total += stale_audio
+
+    print(f"rounds: {rounds}")
+    print(f"abort -> interrupted: {summarize(notices)}")
+    print(
+        f"abort -> last old audio frame: {summarize(last_audio) if last_audio else 'none'} "
+        f"({len(last_audio)}/{rounds} rounds received audio after abort)"
+    )
+    print(f"interrupt-to-silence: {summarize(silences)}")
+    print(f"stale audio after interrupt: {stale_total}")
+    if stale_total:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="打断延迟基准")
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.rounds))
@@ -0,0 +1,168 @@
+"""
+上行拥塞自适应检查：上游停止读取后，编码器是否按积压降低码率
+
+用法（在 backend 目录下执行）:
+    python benchmarks/congestion_adaptation.py
+    python benchmarks/congestion_adaptation.py --stall-after 3 --timeout 20
+
+代理与模拟服务器之间插入一个 TCP 中继，运行 stall_after 秒后中继停止读取（模拟上游卡住），
+中继 socket 的接收缓冲区设得很小，使积压的数据留在代理一侧的发送队列中。
+浏览器按 60ms 的节奏发送语音帧，每 0.5 秒输出一次该会话编码器的码率、积压估计（send_backlog），
+以及 asyncio 写缓冲区与 send_backlog() 读到的字节数。
+停顿后 timeout 秒内码率未下降时以非零状态码退出。
+"""
+
+import argparse
+import asyncio
+import socket
+import sys
+import time
+
+import numpy as np
+import websockets
+
+from standin import FRAME_DURATION, HOST, PROXY_PORT, UPSTREAM_PORT, LocalProxy, StandInServer
+
+from app.proxy.websocket_proxy import send_backlog
+
+RELAY_PORT = 18771
+RELAY_RCVBUF = 4096
+
+
+class SessionRecordingProxy(LocalProxy):
+    """记录每个会话的上游连接与编码器，便于观察自适应过程"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sessions = []
+
+    async def handle_client_messages(self, client_ws, server_ws, session):
+        self.sessions.append((server_ws, session.encoder))
+        await super().handle_client_messages(client_ws, server_ws, session)
+
+
+class StallingRelay:
+    """转发到模拟服务器的 TCP 中继，stall() 之后不再读取上行数据"""
+
+    def __init__(self):
+        self.stalled = False
+        self.client_transports = []
+
+    def stall(self) -> None:
+        # 暂停 transport 读取，而不只是停止读 StreamReader，否则 asyncio 仍会先缓冲约 128KB
+        self.stalled = True
+        for transport in self.client_transports:
+            transport.pause_reading()
+
+    def resume(self) -> None:
+        self.stalled = False
+        for transport in self.client_transports:
+            if not transport.is_closing():
+                transport.resume_reading()
+
+    async def pump(self, reader, writer):
+        try:
+            while data := await reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handler(self, reader, writer):
+        self.client_transports.append(writer.transport)
+        upstream_reader, upstream_writer = await asyncio.open_connection(HOST, UPSTREAM_PORT)
+        await asyncio.gather(
+            self.pump(reader, upstream_writer),
+            self.pump(upstream_reader, writer),
+        )
+
+    async def start(self):
+        # 接收缓冲区需在 listen 之前设置，accept 得到的连接会继承
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RELAY_RCVBUF)
+        sock.bind((HOST, RELAY_PORT))
+        return await asyncio.start_server(self.handler, sock=sock)
+
+
+async def run(args) -> bool:
+    proxy = SessionRecordingProxy(
+        device_id="00:00:00:00:00:00",
+        client_id="benchmark",
+        websocket_url=f"ws://{HOST}:{RELAY_PORT}",
+        ota_version_url="",
+        proxy_host=HOST,
+        proxy_port=PROXY_PORT,
+        token_enable=False,
+        token="",
+    )
+    relay = StallingRelay()
+    relay_server = await relay.start()
+    # 噪声使编码器输出接近设定码率的数据量
+    rng = np.random.default_rng(1)
+    frames = [(rng.standard_normal(960) * 0.3).astype(np.float32).tobytes() for _ in range(50)]
+
+    stepped_down = False
+    try:
+        async with websockets.serve(StandInServer().handler, HOST, UPSTREAM_PORT):
+            async with websockets.serve(proxy.proxy_handler, HOST, PROXY_PORT):
+                async with websockets.connect(f"ws://{HOST}:{PROXY_PORT}") as client:
+                    # 丢弃服务器回复的 echo
+                    reader = asyncio.create_task(_discard(client))
+
+                    start = time.perf_counter()
+                    stall_at = start + args.stall_after
+                    deadline = stall_at + args.timeout
+                    next_report = start
+                    initial_bitrate = None
+                    print(f"{'t(s)':>6} {'bitrate':>8} {'backlog(ms)':>12} {'asyncio(B)':>11} {'queued(B)':>10}")
+                    for i in range(int((deadline - start) / FRAME_DURATION)):
+                        await asyncio.sleep(max(0.0, start + i * FRAME_DURATION - time.perf_counter()))
+                        now = time.perf_counter()
+                        if now >= stall_at and not relay.stalled:
+                            relay.stall()
+                            print("------ 上游停止读取 ------")
+                        await client.send(frames[i % len(frames)])
+
+                        if not proxy.sessions:
+                            continue
+                        server_ws, encoder = proxy.sessions[0]
+                        if initial_bitrate is None:
+                            initial_bitrate = encoder.bitrate
+                        if now >= next_report:
+                            next_report += 0.5
+                            print(
+                                f"{now - start:>6.1f} {encoder.bitrate:>8} "
+                                f"{encoder.send_backlog * 1000:>12.1f} "
+                                f"{server_ws.transport.get_write_buffer_size():>11} "
+                                f"{send_backlog(server_ws):>10}"
+                            )
+                        if relay.stalled and encoder.bitrate < initial_bitrate:
+                            stepped_down = True
+                            print(
+                                f"停顿 {now - stall_at:.1f} 秒后码率下降: "
+                                f"{initial_bitrate} -> {encoder.bitrate}"
+                            )
+                            break
+                    reader.cancel()
+                    # 恢复转发，使各连接能正常完成关闭握手
+                    relay.resume()
+    finally:
+        relay_server.close()
+    return stepped_down
+
+
+async def _discard(client) -> None:
+    async for _ in client:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="上行拥塞自适应检查")
+    parser.add_argument("--stall-after", type=float, default=2, help="上游停止读取前的正常发送时长")
+    parser.add_argument("--timeout", type=float, default=15, help="停顿后等待码率下降的最长时间")
+    if not asyncio.run(run(parser.parse_args())):
+        print("上游停止读取后码率没有下降")
+        sys.exit(1)
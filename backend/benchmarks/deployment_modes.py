@@ -0,0 +1,126 @@
+"""
+部署模式对比基准：双进程（FastAPI + 独立代理进程）与单进程（代理挂载在 FastAPI 上）
+
+用法（在 backend 目录下执行，仅支持 Linux，内存从 /proc 读取）:
+    python benchmarks/deployment_modes.py
+    python benchmarks/deployment_modes.py --frames 500
+
+每种模式在独立的进程树中启动，由本地模拟的小智服务器对每个上行音频帧回复 echo，
+统计：
+    - 单帧往返延迟（浏览器 -> 代理 -> 服务器 -> 代理 -> 浏览器）
+    - 服务进程的常驻内存（RSS）总和
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import time
+
+import numpy as np
+import uvicorn
+import websockets
+
+from standin import (
+    BACKEND_PORT,
+    HOST,
+    PROXY_PORT,
+    StandInServer,
+    UPSTREAM_PORT,
+    create_local_proxy,
+)
+from app import create_app
+from app.router.proxy import PROXY_PATH
+
+MODES = ("process", "embedded")
+
+
+def run_local_proxy():
+    asyncio.run(create_local_proxy().main())
+
+
+def serve(mode: str):
+    app = create_app(proxy=create_local_proxy() if mode == "embedded" else None)
+    uvicorn.run(app, host=HOST, port=BACKEND_PORT, log_level="warning")
+
+
+def rss_kb(pid: int) -> int:
+    """进程及其所有子进程的 RSS 总和（KB）"""
+    total = 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                total += int(line.split()[1])
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            total += sum(rss_kb(int(child)) for child in f.read().split())
+    return total
+
+
+def wait_for_port(port: int, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((HOST, port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"端口 {port} 未就绪")
+
+
+async def measure_rtt(url: str, frames: int) -> list[float]:
+    frame = (np.sin(np.arange(960) / 16000 * 2 * np.pi * 440) * 0.3).astype(np.float32)
+    rtts = []
+    async with websockets.connect(url) as client:
+        for _ in range(frames):
+            start = time.perf_counter()
+            await client.send(frame.tobytes())
+            await client.recv()
+            rtts.append((time.perf_counter() - start) * 1000)
+    return rtts
+
+
+async def run(frames: int) -> None:
+    upstream = StandInServer()
+    async with websockets.serve(upstream.handler, HOST, UPSTREAM_PORT):
+        for mode in MODES:
+            # 双进程模式下代理进程由基准脚本直接启动，与 main.py 的进程布局一致
+            processes = [multiprocessing.Process(target=serve, args=(mode,))]
+            if mode == "process":
+                processes.append(multiprocessing.Process(target=run_local_proxy))
+            for process in processes:
+                process.start()
+            proxy_url = (
+                f"ws://{HOST}:{BACKEND_PORT}{PROXY_PATH}"
+                if mode == "embedded"
+                else f"ws://{HOST}:{PROXY_PORT}"
+            )
+            try:
+                await asyncio.to_thread(wait_for_port, BACKEND_PORT)
+                if mode == "process":
+                    await asyncio.to_thread(wait_for_port, PROXY_PORT)
+                rtts = await measure_rtt(proxy_url, frames)
+                memory = sum(rss_kb(process.pid) for process in processes)
+            finally:
+                for process in processes:
+                    process.terminate()
+                    process.join()
+
+            rtts.sort()
+            print(f"== {mode} ==")
+            print(f"RSS: {memory / 1024:.1f} MB")
+            print(
+                f"frame RTT: mean {statistics.mean(rtts):.3f} ms, "
+                f"p50 {rtts[len(rtts) // 2]:.3f} ms, p99 {rtts[int(len(rtts) * 0.99)]:.3f} ms"
+            )
+            print()
+
+
+if __name__ == "__main__":
+    multiprocessing.set_start_method("spawn")
+    parser = argparse.ArgumentParser(description="部署模式对比基准")
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.frames))
@@ -0,0 +1,142 @@
+"""
+下行语音组装微基准：逐包 bytearray 拼接（旧实现）与 WavAssembler 对比
+
+用法（在 backend 目录下执行）:
+    python benchmarks/downlink_assembler.py
+    python benchmarks/downlink_assembler.py --seconds 600
+
+对同一段 60ms Opus 语音流分别运行两种实现（与 handle_server_messages 相同的
+64KB 分段发送，发送本身替换为空操作），按每秒语音（单路会话）统计：
+    - 新分配的内存：tracemalloc 逐包测得的内存峰值增量之和
+      （复制到新缓冲区必然伴随分配，复制到已有缓冲区的部分不计入）
+    - 发生内存分配的包占比，以及运行前后 sys.getallocatedblocks() 的差值（泄漏检查）
+    - 组装耗费的 CPU 时间（单独运行，不开启 tracemalloc）
+
+WavAssembler 剩余的少量分配（每包数百字节）来自 ctypes 外部函数调用本身的参数转换，
+与包大小无关，不涉及音频数据。
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+
+from standin import FRAME_DURATION, make_opus_frame  # 需先于 opuslib 导入以加载 opus 动态库
+import opuslib
+from app.utils.audio import WavAssembler
+
+FLUSH_BYTES = 64000
+
+
+def send(data) -> None:
+    """代替 client_ws.send"""
+
+
+class LegacyAssembler:
+    """重构前 handle_server_messages 中的下行组装逻辑"""
+
+    def __init__(self):
+        self.decoder = opuslib.Decoder(16000, 1)
+        self.audio_buffer = bytearray()
+        self.is_first_audio = True
+        self.total_samples = 0
+
+    def feed(self, message: bytes) -> None:
+        pcm_data = self.decoder.decode(message, 960)
+        self.total_samples += len(pcm_data) // 2
+        if self.is_first_audio:
+            header = bytearray(44)
+            header[0:4] = b"RIFF"
+            header[4:8] = (self.total_samples * 2 + 36).to_bytes(4, "little")
+            header[8:12] = b"WAVE"
+            header[12:16] = b"fmt "
+            header[16:20] = (16).to_bytes(4, "little")
+            header[20:22] = (1).to_bytes(2, "little")
+            header[22:24] = (1).to_bytes(2, "little")
+            header[24:28] = (16000).to_bytes(4, "little")
+            header[28:32] = (32000).to_bytes(4, "little")
+            header[32:34] = (2).to_bytes(2, "little")
+            header[34:36] = (16).to_bytes(2, "little")
+            header[36:40] = b"data"
+            header[40:44] = (self.total_samples * 2).to_bytes(4, "little")
+            self.audio_buffer.extend(header)
+            self.is_first_audio = False
+
+        self.audio_buffer.extend(pcm_data)
+        if len(self.audio_buffer) >= FLUSH_BYTES + 44:
+            self.audio_buffer[4:8] = (self.total_samples * 2 + 36).to_bytes(4, "little")
+            self.audio_buffer[40:44] = (self.total_samples * 2).to_bytes(4, "little")
+            send(bytes(self.audio_buffer))
+            self.audio_buffer = bytearray()
+            self.is_first_audio = True
+            self.total_samples = 0
+
+
+class AssemblerFeeder:
+    """WavAssembler：解码到预分配缓冲区，原地写入 Wave 头，以 memoryview 发送"""
+
+    def __init__(self):
+        self.assembler = WavAssembler(flush_bytes=FLUSH_BYTES)
+
+    def feed(self, message: bytes) -> None:
+        if self.assembler.append(message):
+            send(self.assembler.flush())
+
+
+def measure_allocations(feeder, frames: list[bytes]) -> tuple[int, int, int]:
+    """
+    返回:
+        tuple[int, int, int]: 新分配的总字节数、发生分配的包数、运行前后内存块数之差
+    """
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    allocated = 0
+    allocating_packets = 0
+    for message in frames:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        feeder.feed(message)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - current
+        allocating_packets += peak > current
+    tracemalloc.stop()
+    return allocated, allocating_packets, sys.getallocatedblocks() - blocks_before
+
+
+def run(name, feeder_class, frames: list[bytes], audio_seconds: float) -> None:
+    # 先预热一遍，排除首次调用时的缓存与类型对象创建
+    feeder = feeder_class()
+    for message in frames[:100]:
+        feeder.feed(message)
+    allocated, allocating_packets, leaked_blocks = measure_allocations(feeder, frames)
+
+    feeder = feeder_class()
+    start = time.process_time()
+    for message in frames:
+        feeder.feed(message)
+    cpu = time.process_time() - start
+
+    print(f"== {name} ==")
+    print(f"bytes allocated / audio second:  {allocated / audio_seconds:,.0f}")
+    print(f"packets that allocate:           {allocating_packets / len(frames) * 100:.1f}%")
+    print(f"allocated blocks after run:      {leaked_blocks:+d}")
+    print(f"CPU per audio second:            {cpu / audio_seconds * 1e6:.1f} us")
+    print()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="下行语音组装微基准")
+    parser.add_argument("--seconds", type=float, default=300, help="模拟的语音时长")
+    args = parser.parse_args()
+
+    frames = [make_opus_frame()] * int(args.seconds / FRAME_DURATION)
+    audio_seconds = len(frames) * FRAME_DURATION
+    direct = WavAssembler()._opus_decode is not None
+    print(f"{len(frames)} 帧，{audio_seconds:.0f} 秒语音，直接解码: {direct}")
+    print()
+    run("legacy bytearray", LegacyAssembler, frames, audio_seconds)
+    run("WavAssembler", AssemblerFeeder, frames, audio_seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+基准测试共用的本地模拟服务：模拟的小智服务器（WebSocket 或 MQTT + UDP）与跳过 OTA 注册的代理
+"""
+
+import asyncio
+import json
+import os
+import struct
+import sys
+import uuid
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.system_info import setup_opus  # noqa: E402
+
+setup_opus()
+
+import numpy as np  # noqa: E402
+import opuslib  # noqa: E402
+
+from app.proxy.mqtt_udp import UdpAudioChannel  # noqa: E402
+from app.proxy.websocket_proxy import WebSocketProxy  # noqa: E402
+
+HOST = "127.0.0.1"
+UPSTREAM_PORT = 18765
+PROXY_PORT = 18766
+BACKEND_PORT = 18767
+MQTT_PORT = 18768
+PUBLISH_TOPIC = "device-server"
+FRAME_DURATION = 0.06  # 60ms
+ECHO_MESSAGE = json.dumps({"type": "echo"})
+
+
+def make_opus_frame() -> bytes:
+    """生成一帧 60ms、16kHz 的正弦波 Opus 数据"""
+    t = np.arange(960) / 16000
+    pcm = (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16)
+    return opuslib.Encoder(16000, 1, "voip").encode(pcm.tobytes(), 960)
+
+
+class StandInServer:
+    """
+    模拟的小智服务器：
+        - 收到 listen 后开始持续推送 TTS 语音，收到 abort 后停止
+        - 收到上行音频时回复一条 echo 文本，便于测量单帧往返延迟
+    """
+
+    def __init__(self):
+        self.frame = make_opus_frame()
+
+    async def handler(self, websocket):
+        speaking: asyncio.Task | None = None
+        async for message in websocket:
+            if not isinstance(message, str):
+                await websocket.send(ECHO_MESSAGE)
+                continue
+            msg_type = json.loads(message).get("type")
+            if msg_type == "listen":
+                speaking = asyncio.create_task(self.speak(websocket))
+            elif msg_type == "abort" and speaking is not None:
+                # 模拟服务器处理 abort 的耗时，期间仍有旧语音在途
+                await asyncio.sleep(0.2)
+                speaking.cancel()
+                await websocket.send(json.dumps({"type": "tts", "state": "stop"}))
+
+    async def speak(self, websocket):
+        await websocket.send(json.dumps({"type": "tts", "state": "start"}))
+        while True:
+            await websocket.send(self.frame)
+            await asyncio.sleep(FRAME_DURATION)
+
+
+class MqttUdpSession:
+    """
+    模拟服务器一侧的 MQTT + UDP 会话，接口与 WebSocket 连接相同（send / async for），
+    使 StandInServer.handler 不经修改即可服务 MQTT 模式的代理
+    """
+
+    def __init__(self, broker: "StandInMqttBroker", writer: asyncio.StreamWriter):
+        self.broker = broker
+        self.writer = writer
+        self.topic = ""  # 设备订阅的主题，服务器消息发往该主题
+        self.udp: UdpAudioChannel | None = None
+        self.messages: asyncio.Queue[str | bytes | None] = asyncio.Queue()
+        self.sequence: int = 0  # 最近一次迭代得到的上行音频的 UDP 包序号
+        self._sequences: deque[int] = deque()
+
+    async def handle_control(self, message: str) -> None:
+        data = json.loads(message)
+        if data.get("type") == "hello":
+            await self.open_udp(data)
+        elif data.get("type") == "goodbye":
+            self.messages.put_nowait(None)
+        else:
+            self.messages.put_nowait(message)
+
+    async def open_udp(self, hello: dict) -> None:
+        # nonce 模板: type=0x01，随机 ssrc，其余字段由发送方逐包填写
+        key, nonce = os.urandom(16), bytes([0x01, 0, 0, 0]) + os.urandom(4) + bytes(8)
+        loop = asyncio.get_running_loop()
+        transport, self.udp = await loop.create_datagram_endpoint(
+            lambda: StandInUdpChannel(key, nonce, self._on_audio), local_addr=(HOST, 0)
+        )
+        server, port = await self.broker.udp_address(transport.get_extra_info("sockname"))
+        await self.send(json.dumps({
+            "type": "hello",
+            "transport": "udp",
+            "session_id": str(uuid.uuid4()),
+            "audio_params": hello.get("audio_params", {}),
+            "udp": {"server": server, "port": port, "key": key.hex(), "nonce": nonce.hex()},
+        }))
+
+    def _on_audio(self, opus_data: bytes) -> None:
+        self._sequences.append(self.udp.remote_sequence)
+        self.messages.put_nowait(opus_data)
+
+    async def send(self, message: str | bytes) -> None:
+        if isinstance(message, str):
+            self.writer.write(mqtt_publish_packet(self.topic, message.encode()))
+            await self.writer.drain()
+        elif self.udp is not None:
+            self.udp.send(message)
+
+    def __aiter__(self):
+        return self._iter_messages()
+
+    async def _iter_messages(self):
+        while (message := await self.messages.get()) is not None:
+            if isinstance(message, bytes):
+                self.sequence = self._sequences.popleft()
+            yield message
+
+    def close(self) -> None:
+        if self.udp is not None:
+            self.udp.close()
+        self.messages.put_nowait(None)
+
+
+class StandInUdpChannel(UdpAudioChannel):
+    """服务器一侧的 UDP 通道：socket 不 connect，回复发往最近一次收到数据的地址"""
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.peer = addr
+        super().datagram_received(data, addr)
+
+
+def mqtt_publish_packet(topic: str, payload: bytes) -> bytes:
+    """QoS 0 的 MQTT PUBLISH 报文"""
+    body = struct.pack(">H", len(topic)) + topic.encode() + payload
+    return bytes([0x30]) + mqtt_remaining_length(len(body)) + body
+
+
+def mqtt_remaining_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(encoded)
+
+
+class StandInMqttBroker:
+    """
+    模拟的小智 MQTT 服务器（MQTT 3.1.1 的最小子集，仅支持 QoS 0/1），
+    每个 MQTT 连接视为一台设备，控制消息与 UDP 音频交给 server.handler 处理
+
+    参数:
+        server (StandInServer): 处理会话的模拟服务器
+        udp_address (Callable | None): 将会话的 UDP 地址映射为下发给设备的地址（如经过中继），
+            为 None 时直接下发
+    """
+
+    def __init__(self, server: StandInServer, udp_address=None):
+        self.server = server
+        self._udp_address = udp_address
+
+    async def udp_address(self, sockname: tuple) -> tuple[str, int]:
+        if self._udp_address is None:
+            return sockname[0], sockname[1]
+        return await self._udp_address(sockname)
+
+    async def handler(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = MqttUdpSession(self, writer)
+        serving = asyncio.create_task(self.server.handler(session))
+        try:
+            while True:
+                packet_type, flags, body = await self._read_packet(reader)
+                if packet_type == 1:  # CONNECT
+                    writer.write(b"\x20\x02\x00\x00")
+                elif packet_type == 8:  # SUBSCRIBE
+                    topic_length = struct.unpack_from(">H", body, 2)[0]
+                    session.topic = body[4 : 4 + topic_length].decode()
+                    writer.write(b"\x90\x03" + body[:2] + b"\x00")
+                elif packet_type == 3:  # PUBLISH
+                    topic_length = struct.unpack_from(">H", body)[0]
+                    offset = 2 + topic_length
+                    if flags & 0x06:  # QoS 1，回复 PUBACK
+                        writer.write(b"\x40\x02" + body[offset : offset + 2])
+                        offset += 2
+                    await session.handle_control(body[offset:].decode())
+                elif packet_type == 12:  # PINGREQ
+                    writer.write(b"\xd0\x00")
+                elif packet_type == 14:  # DISCONNECT
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            session.close()
+            serving.cancel()
+            writer.close()
+
+    @staticmethod
+    async def _read_packet(reader: asyncio.StreamReader) -> tuple[int, int, bytes]:
+        first = (await reader.readexactly(1))[0]
+        length, shift = 0, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return first >> 4, first & 0x0F, await reader.readexactly(length)
+
+
+class LocalProxy(WebSocketProxy):
+    """跳过 OTA 注册，直接连接本地模拟服务器"""
+
+    def _update_ota_address(self, identity):
+        # 模拟 OTA 返回的 MQTT 连接信息，仅在 upstream_transport="mqtt" 时使用
+        return {
+            "endpoint": f"{HOST}:{MQTT_PORT}",
+            "client_id": identity.client_id,
+            "username": "",
+            "password": "",
+            "publish_topic": PUBLISH_TOPIC,
+            "subscribe_topic": f"devices/p2p/{identity.device_id}",
+        }
+
+
+def create_local_proxy(upstream_transport: str = "websocket") -> LocalProxy:
+    return LocalProxy(
+        device_id="00:00:00:00:00:00",
+        client_id="benchmark",
+        websocket_url=f"ws://{HOST}:{UPSTREAM_PORT}",
+        ota_version_url="",
+        proxy_host=HOST,
+        proxy_port=PROXY_PORT,
+        token_enable=False,
+        token="",
+        upstream_transport=upstream_transport,
+    )
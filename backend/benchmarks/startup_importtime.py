@@ -0,0 +1,124 @@
+"""
+启动耗时基准：使用 `python -X importtime` 统计主进程与代理进程的导入开销
+
+用法（在 backend 目录下执行）:
+    python benchmarks/startup_importtime.py
+    python benchmarks/startup_importtime.py --top 15 --repeat 9
+    python benchmarks/startup_importtime.py --budget-ms 300 proxy
+
+每个场景在全新的解释器中重复运行 repeat 次，输出总耗时的中位数、导入耗时以及累计耗时
+最高的顶层模块。任一场景的中位数超出预算（默认使用 SCENARIOS 中各场景的预算，
+--budget-ms 可统一覆盖）时以非零状态码退出，便于在 CI 中做回归检查。
+优化前后的实测结果见 benchmarks/reports/startup_importtime.md。
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 场景名 -> (在子解释器中执行的启动代码, 总耗时预算 ms)
+# 预算约为 reports/startup_importtime.md 中优化后中位数的 2 倍，给不同机器留出余量
+BUDGET_MAIN_MS = 700
+BUDGET_PROXY_MS = 400
+SCENARIOS = {
+    # 主进程：FastAPI 应用 + 配置 + 代理进程入口（不应导入 numpy / opuslib / websockets）
+    "main": (
+        "from app.utils.logger import setup_logging; setup_logging(); "
+        "import uvicorn; "
+        "from app import create_app; "
+        "from app.proxy.process_handler import run_proxy; "
+        "create_app()",
+        BUDGET_MAIN_MS,
+    ),
+    # 代理进程：加载 opus、导入代理实现并创建代理实例
+    # （设备身份的 OTA 注册在 main() 中并发进行，不计入）
+    "proxy": (
+        "from app.utils.logger import setup_logging; setup_logging(); "
+        "from app.utils.system_info import setup_opus; setup_opus(); "
+        "from app.proxy.process_handler import create_proxy; create_proxy()",
+        BUDGET_PROXY_MS,
+    ),
+}
+
+
+def parse_importtime(stderr: str) -> list[tuple[int, int, int, str]]:
+    """
+    解析 -X importtime 输出
+
+    返回:
+        list[tuple]: (self_us, cumulative_us, depth, module)
+    """
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        self_us, cumulative_us, name = fields
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        records.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return records
+
+
+def run_scenario(code: str) -> tuple[float, list[tuple[int, int, int, str]]]:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        tail = "\n".join(result.stderr.strip().splitlines()[-5:])
+        raise RuntimeError(f"启动代码执行失败:\n{tail}")
+    return wall_ms, parse_importtime(result.stderr)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="主进程 / 代理进程启动耗时基准")
+    parser.add_argument("--top", type=int, default=10, help="显示累计耗时最高的前 N 个顶层模块")
+    parser.add_argument("--repeat", type=int, default=5, help="每个场景的运行次数，取中位数")
+    parser.add_argument(
+        "--budget-ms", type=float, default=None, help="统一覆盖各场景的启动耗时预算"
+    )
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS), help="要运行的场景")
+    args = parser.parse_args()
+
+    over_budget = False
+    for name in args.scenarios:
+        code, budget_ms = SCENARIOS[name]
+        if args.budget_ms is not None:
+            budget_ms = args.budget_ms
+        runs = [run_scenario(code) for _ in range(max(1, args.repeat))]
+        wall_ms = statistics.median(run[0] for run in runs)
+        # 模块明细取总耗时最接近中位数的一次
+        _, records = min(runs, key=lambda run: abs(run[0] - wall_ms))
+        top_level = [r for r in records if r[2] == 0]
+        import_ms = sum(r[1] for r in top_level) / 1000
+
+        print(f"== {name} ==")
+        print(
+            f"总耗时（{len(runs)} 次中位数）: {wall_ms:.1f} ms, 预算: {budget_ms:.0f} ms, "
+            f"导入耗时: {import_ms:.1f} ms, 模块数: {len(records)}"
+        )
+        print(f"{'cumulative(ms)':>15} {'self(ms)':>10}  module")
+        for self_us, cumulative_us, _, module in sorted(top_level, key=lambda r: -r[1])[: args.top]:
+            print(f"{cumulative_us / 1000:>15.1f} {self_us / 1000:>10.1f}  {module}")
+        print()
+
+        if wall_ms > budget_ms:
+            print(f"[{name}] 超出启动预算: {wall_ms:.1f} ms > {budget_ms:.1f} ms")
+            over_budget = True
+
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""
+上游传输方式对比基准：有丢包的上行链路下，WebSocket 与 MQTT + UDP 的语音延迟
+
+用法（在 backend 目录下执行）:
+    python benchmarks/upstream_transports.py
+    python benchmarks/upstream_transports.py --loss 0.05 --rto-ms 200 --frames 500
+
+代理与模拟服务器之间插入有损的上行链路中继：
+    - TCP（WebSocket、MQTT 控制通道）：每个数据块以 loss 的概率"丢失"，等待一个 RTO
+      后重传，其后的数据全部排队等待（队头阻塞）；不模拟拥塞窗口回退，对 TCP 偏乐观
+    - UDP：每个数据包以 loss 的概率直接丢弃
+浏览器按 60ms 的节奏发送语音帧，统计每帧从浏览器发出到模拟服务器收到的延迟与丢帧率。
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import numpy as np
+import websockets
+
+from standin import (
+    FRAME_DURATION,
+    HOST,
+    MQTT_PORT,
+    PROXY_PORT,
+    UPSTREAM_PORT,
+    MqttUdpSession,
+    StandInMqttBroker,
+    StandInServer,
+    create_local_proxy,
+)
+
+WS_RELAY_PORT = 18769
+MQTT_RELAY_PORT = 18770
+TRANSPORTS = ("websocket", "mqtt")
+
+
+class RecordingServer(StandInServer):
+    """记录每个上行语音帧（按序号）到达的时间"""
+
+    def __init__(self):
+        super().__init__()
+        self.arrivals: dict[int, float] = {}
+
+    async def handler(self, websocket):
+        count = 0
+        async for message in websocket:
+            if isinstance(message, str):
+                if json.loads(message).get("type") == "hello":
+                    await websocket.send(json.dumps({"type": "hello", "session_id": "benchmark"}))
+                continue
+            count += 1
+            sequence = websocket.sequence if isinstance(websocket, MqttUdpSession) else count
+            self.arrivals[sequence] = time.perf_counter()
+
+
+class LossyLink:
+    def __init__(self, loss: float, rto: float, seed: int):
+        self.loss = loss
+        self.rto = rto
+        self.random = random.Random(seed)
+
+    def lost(self) -> bool:
+        return self.random.random() < self.loss
+
+    def tcp_relay(self, target_port: int):
+        """TCP 中继：上行方向丢失的数据块在 RTO 后重传，期间阻塞后续数据"""
+
+        async def pump(reader, writer, lossy: bool):
+            try:
+                while data := await reader.read(65536):
+                    if lossy and self.lost():
+                        await asyncio.sleep(self.rto)
+                    writer.write(data)
+                    await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                writer.close()
+
+        async def handler(reader, writer):
+            upstream_reader, upstream_writer = await asyncio.open_connection(HOST, target_port)
+            await asyncio.gather(
+                pump(reader, upstream_writer, lossy=True),
+                pump(upstream_reader, writer, lossy=False),
+            )
+
+        return handler
+
+    async def udp_relay(self, server_address: tuple) -> tuple[str, int]:
+        """为一个会话的 UDP 通道建立中继，上行方向按概率丢包，返回中继地址"""
+        loop = asyncio.get_running_loop()
+        link = self
+        client_address = None
+
+        class ClientSide(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                nonlocal client_address
+                client_address = addr
+                if not link.lost():
+                    server_side.sendto(data)
+
+        class ServerSide(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                if client_address is not None:
+                    client_side.sendto(data, client_address)
+
+        client_side, _ = await loop.create_datagram_endpoint(ClientSide, local_addr=(HOST, 0))
+        server_side, _ = await loop.create_datagram_endpoint(
+            ServerSide, remote_addr=server_address[:2]
+        )
+        return client_side.get_extra_info("sockname")[:2]
+
+
+async def measure(transport: str, link: LossyLink, frames: int) -> dict[int, float]:
+    """返回每个语音帧（序号从 1 开始）的发送时间，同时由服务器记录到达时间"""
+    proxy = create_local_proxy(transport)
+    proxy.websocket_url = f"ws://{HOST}:{WS_RELAY_PORT}"
+    await proxy.register_identities()
+    for identity in proxy.identity_pool.identities:
+        identity.mqtt_info["endpoint"] = f"{HOST}:{MQTT_RELAY_PORT}"
+
+    frame = (np.sin(np.arange(960) / 16000 * 2 * np.pi * 440) * 0.3).astype(np.float32).tobytes()
+    sent = {}
+    async with websockets.serve(proxy.proxy_handler, HOST, PROXY_PORT):
+        async with websockets.connect(f"ws://{HOST}:{PROXY_PORT}") as client:
+            await client.send(json.dumps({"type": "hello", "version": 3}))
+            await client.recv()
+            start = time.perf_counter()
+            for i in range(frames):
+                await asyncio.sleep(max(0.0, start + i * FRAME_DURATION - time.perf_counter()))
+                sent[i + 1] = time.perf_counter()
+                await client.send(frame)
+            # 等待排队中的数据全部送达
+            await asyncio.sleep(1 + link.rto * 5)
+    return sent
+
+
+async def run(args) -> None:
+    for transport in TRANSPORTS:
+        server = RecordingServer()
+        link = LossyLink(args.loss, args.rto_ms / 1000, args.seed)
+        broker = StandInMqttBroker(server, udp_address=link.udp_relay)
+        servers = [
+            await asyncio.start_server(broker.handler, HOST, MQTT_PORT),
+            await asyncio.start_server(link.tcp_relay(UPSTREAM_PORT), HOST, WS_RELAY_PORT),
+            await asyncio.start_server(link.tcp_relay(MQTT_PORT), HOST, MQTT_RELAY_PORT),
+        ]
+        try:
+            async with websockets.serve(server.handler, HOST, UPSTREAM_PORT):
+                sent = await measure(transport, link, args.frames)
+        finally:
+            for tcp_server in servers:
+                tcp_server.close()
+
+        latencies = sorted(
+            (server.arrivals[seq] - sent[seq]) * 1000 for seq in sent if seq in server.arrivals
+        )
+        spikes = sum(1 for latency in latencies if latency > args.spike_ms)
+        print(f"== {transport} ==")
+        print(f"frames: {len(sent)}, lost: {(1 - len(latencies) / len(sent)) * 100:.1f}%")
+        print(
+            f"latency: mean {statistics.mean(latencies):.1f} ms, "
+            f"p50 {latencies[len(latencies) // 2]:.1f} ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99)]:.1f} ms, max {latencies[-1]:.1f} ms"
+        )
+        print(f"spikes > {args.spike_ms:.0f} ms: {spikes}")
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="上游传输方式对比基准")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--loss", type=float, default=0.03, help="上行链路丢包率")
+    parser.add_argument("--rto-ms", type=float, default=200, help="TCP 重传超时")
+    parser.add_argument("--spike-ms", type=float, default=100, help="计为延迟尖峰的阈值")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
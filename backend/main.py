@@ -1,9 +1,5 @@
 from urllib.parse import urlparse
-from app.utils.logger import get_logger, setup_logging
-from app.utils.system_info import setup_opus
-
-setup_logging()
-setup_opus()  # 在导入 opuslib 之前 windows 需要手动加载 opus.dll 动态链接库
+from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 proxy_process = None
@@ -11,17 +7,53 @@ proxy_process = None
 if __name__ == "__main__":
     import atexit
     import multiprocessing
+    from app.utils.logger import setup_logging
+
+    # 日志与 opus 只在真正使用它们的进程中初始化：
+    # 主进程只需要日志，opus 由代理进程在 run_proxy 中加载
+    setup_logging()
+
     import uvicorn
 
     from app import create_app
     from app.config import ConfigManager
-    from app.proxy.process_handler import run_proxy, cleanup
+    from app.proxy.process_handler import cleanup, ensure_device_identities, run_proxy
 
-    app = create_app()
     configuration = ConfigManager()
 
-    # 注册退出时的清理函数
-    atexit.register(cleanup, proxy_process)
+    BACKEND_URL = str(configuration.get("BACKEND_URL"))
+    parsed_url = urlparse(BACKEND_URL)
+    BACKEND_HOST = parsed_url.hostname
+    BACKEND_PORT = parsed_url.port
+    
+    if BACKEND_HOST is None or BACKEND_PORT is None:
+        logger.error(f"无效的 BACKEND_URL: {BACKEND_URL}")
+        exit(1)
+
+    # 在启动代理进程 / uvicorn worker 之前生成设备身份，所有进程读取同一份配置
+    ensure_device_identities(configuration)
+
+    if configuration.get_str("PROXY_MODE") == "embedded":
+        # 单进程模式：代理挂载在 FastAPI 的 WebSocket 路由上，由每个 uvicorn worker 通过 create_app 创建
+        workers = configuration.get_int("WORKERS")
+        # 每个 worker 各自持有一份身份池，worker 之间不协调租用：
+        # 需要限制单个身份并发会话数时（MQTT 模式或 DEVICE_MAX_SESSIONS > 0）只能使用单个 worker
+        if workers > 1 and (
+            configuration.get_str("UPSTREAM_TRANSPORT") == "mqtt"
+            or configuration.get_int("DEVICE_MAX_SESSIONS") > 0
+        ):
+            logger.error(
+                f"WORKERS={workers} 时无法保证每个设备身份的会话数限制，"
+                f"MQTT 模式或设置了 DEVICE_MAX_SESSIONS 时请将 WORKERS 设为 1"
+            )
+            exit(1)
+        logger.info(f"FastAPI 服务器地址（内置代理）: {BACKEND_HOST}:{BACKEND_PORT}, workers: {workers}")
+        uvicorn.run(
+            "app:create_app", factory=True, host=BACKEND_HOST, port=BACKEND_PORT, workers=workers
+        )
+        exit(0)
+
+    app = create_app()
 
     # 启动 Proxy 服务器
     proxy_process = multiprocessing.Process(target=run_proxy, name="ProxyProcess")
@@ -30,15 +62,9 @@ if __name__ == "__main__":
         f"代理服务器已启动: {configuration.get('WS_PROXY_URL')}, PID: {proxy_process.pid}"
     )
 
+    # 注册退出时的清理函数
+    atexit.register(cleanup, proxy_process)
+
     # 启动 FastAPI 服务器
-    BACKEND_URL = str(configuration.get("BACKEND_URL"))
-    parsed_url = urlparse(BACKEND_URL)
-    BACKEND_HOST = parsed_url.hostname
-    BACKEND_PORT = parsed_url.port
-    
-    if BACKEND_HOST is None or BACKEND_PORT is None:
-        logger.error(f"无效的 BACKEND_URL: {BACKEND_URL}")
-        exit(1)
-        
     logger.info(f"FastAPI 服务器地址: {BACKEND_HOST}:{BACKEND_PORT}")
     uvicorn.run(app, host=BACKEND_HOST, port=BACKEND_PORT)
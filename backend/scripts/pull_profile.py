@@ -0,0 +1,140 @@
+"""
+从运行中的节点拉取代理性能分析数据（需在配置中开启 PROFILING_ENABLE 并设置 PROFILING_TOKEN，
+令牌通过 --token 或环境变量 XIAOZHI_PROFILING_TOKEN 传入）
+
+用法:
+    # 采样 10 秒，输出折叠栈文件（可用 flamegraph.pl / speedscope 生成火焰图）
+    python scripts/pull_profile.py --backend http://127.0.0.1:8081 cpu --seconds 10 -o proxy.folded
+
+    # 查看 / 清零热路径阶段耗时
+    python scripts/pull_profile.py --backend http://127.0.0.1:8081 timers --enable
+    python scripts/pull_profile.py --backend http://127.0.0.1:8081 timers --reset
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from urllib.parse import urlencode
+
+WRONG_WORKER_CODE = 2
+TOKEN_HEADER = "X-Profiling-Token"
+
+
+def request(
+    backend: str, token: str, method: str, path: str, params: dict | None = None
+) -> tuple[int, dict]:
+    url = f"{backend.rstrip('/')}/profile/{path}"
+    if params:
+        url += "?" + urlencode(params)
+    req = urllib.request.Request(url, method=method, headers={TOKEN_HEADER: token})
+    try:
+        with urllib.request.urlopen(req, timeout=15) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def request_worker(
+    backend: str, token: str, method: str, path: str, params: dict, retries: int = 50
+) -> dict:
+    """请求指定 worker（params 中的 pid），落在其他 worker 上时重试"""
+    for _ in range(retries):
+        status, content = request(backend, token, method, path, params)
+        if content.get("code") != WRONG_WORKER_CODE:
+            if status != 200:
+                sys.exit(f"请求失败: HTTP {status}, {content.get('message')}")
+            return content["data"]
+    sys.exit(f"多次重试后仍未命中 worker {params.get('pid')}")
+
+
+def print_top_functions(collapsed: str, top: int) -> None:
+    """按叶子帧（自身耗时）汇总采样"""
+    leaves: Counter[str] = Counter()
+    total = 0
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(" ")
+        leaves[stack.rsplit(";", 1)[-1]] += int(count)
+        total += int(count)
+    if not total:
+        print("没有采集到样本")
+        return
+    print(f"{'self%':>7}  function")
+    for frame, count in leaves.most_common(top):
+        print(f"{count / total * 100:>6.1f}%  {frame}")
+
+
+def cpu(args) -> None:
+    params = {"seconds": args.seconds, "interval_ms": args.interval_ms}
+    if args.pid:
+        params["pid"] = args.pid
+    data = request_worker(args.backend, args.token, "POST", "cpu/start", params)
+    pid = data["pid"]
+    print(f"正在采样进程 {pid}，{data['seconds']} 秒...")
+    time.sleep(data["seconds"])
+
+    while True:
+        data = request_worker(args.backend, args.token, "GET", "cpu/result", {"pid": pid})
+        if not data["running"]:
+            break
+        time.sleep(0.5)
+
+    with open(args.output, "w") as f:
+        f.write(data["collapsed"] + "\n")
+    print(f"共 {data['samples']} 个样本，折叠栈已写入 {args.output}")
+    print_top_functions(data["collapsed"], args.top)
+
+
+def timers(args) -> None:
+    params = {"pid": args.pid} if args.pid else {}
+    if args.enable or args.disable:
+        enabled = {**params, "enabled": bool(args.enable)}
+        request_worker(args.backend, args.token, "POST", "timers/enable", enabled)
+    data = request_worker(
+        args.backend, args.token, "GET", "timers", {**params, "reset": args.reset}
+    )
+    print(f"进程 {data['pid']}，阶段计时{'已开启' if data['enabled'] else '已关闭'}")
+    print(f"{'stage':<16}{'count':>10}{'total(ms)':>12}{'avg(us)':>10}{'max(us)':>10}")
+    stages = sorted(data["stages"].items(), key=lambda item: -item[1]["total_ms"])
+    for stage, stat in stages:
+        print(
+            f"{stage:<16}{stat['count']:>10}{stat['total_ms']:>12.1f}"
+            f"{stat['avg_us']:>10.1f}{stat['max_us']:>10.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="拉取代理性能分析数据")
+    parser.add_argument("--backend", default="http://127.0.0.1:8081", help="FastAPI 服务地址")
+    parser.add_argument("--pid", type=int, default=None, help="单进程多 worker 时指定 worker 进程")
+    parser.add_argument(
+        "--token",
+        default=os.environ.get("XIAOZHI_PROFILING_TOKEN", ""),
+        help="分析接口令牌（PROFILING_TOKEN）",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    cpu_parser = subparsers.add_parser("cpu", help="采样分析")
+    cpu_parser.add_argument("--seconds", type=float, default=10)
+    cpu_parser.add_argument("--interval-ms", type=float, default=5)
+    cpu_parser.add_argument("--top", type=int, default=15, help="显示自身耗时最高的前 N 个函数")
+    cpu_parser.add_argument("-o", "--output", default="proxy.folded")
+    cpu_parser.set_defaults(func=cpu)
+
+    timers_parser = subparsers.add_parser("timers", help="热路径阶段耗时")
+    toggle = timers_parser.add_mutually_exclusive_group()
+    toggle.add_argument("--enable", action="store_true")
+    toggle.add_argument("--disable", action="store_true")
+    timers_parser.add_argument("--reset", action="store_true", help="读取后清零")
+    timers_parser.set_defaults(func=timers)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
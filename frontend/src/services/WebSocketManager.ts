@@ -2,6 +2,18 @@ import { computed, ref } from 'vue'
 import type { WebSocketMessage } from '@/types/message'
 import type { WebSocketDependencies, WebSocketHandlers } from '@/types/websocket'
 
+const BROWSER_ID_KEY = 'browser_id'
+
+// 浏览器的稳定标识，代理据此让同一浏览器优先使用上次分配的设备身份
+function getBrowserId(): string {
+    let browserId = localStorage.getItem(BROWSER_ID_KEY)
+    if (!browserId) {
+        browserId = Date.now().toString(36) + Math.random().toString(36).slice(2)
+        localStorage.setItem(BROWSER_ID_KEY, browserId)
+    }
+    return browserId
+}
+
 export class WebSocketService {
     private _connectionStatus = ref<'connected' | 'disconnected' | 'error'>('disconnected')
     readonly connectionStatus = computed(() => this._connectionStatus.value)
@@ -16,7 +28,9 @@ export class WebSocketService {
     }
 
     public connect(url: string | URL): void {
-        this.ws = new WebSocket(url)
+        const proxyUrl = new URL(url)
+        proxyUrl.searchParams.set('browser_id', getBrowserId())
+        this.ws = new WebSocket(proxyUrl)
         this.ws.onopen = this.handleOpen.bind(this)
         this.ws.onclose = this.handleClose.bind(this)
         this.ws.onerror = this.handleError.bind(this)
@@ -8,6 +8,7 @@ export type WebSocketMessage =
     | HelloResponse
     | UserEcho
     | AI_TTS_Start
+    | AI_TTS_Interrupted
     | AIResponse_Emotion
     | AIResponse_Text
 
@@ -49,6 +50,12 @@ export type AI_TTS_Start = {
     session_id: string
 }
 
+// 代理在收到 abort 后发送，通知前端停止播放已排队的语音
+export type AI_TTS_Interrupted = {
+    type: 'tts'
+    state: 'interrupted'
+}
+
 export type AIResponse_Emotion = {
     type: 'llm'
     text: string